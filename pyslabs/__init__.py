@@ -2,3 +2,5 @@
 
 from .const import UNLIMITED
 from .core import master_open, parallel_open, open
+from .cache import SlabCache, shared_cache
+from .rechunk import rechunk
@@ -0,0 +1,119 @@
+"""Pyslabs slab cache module
+
+
+"""
+
+import threading
+
+from collections import OrderedDict
+from pyslabs.const import CACHE_SIZE
+
+
+class SlabCache():
+    """LRU cache of loaded slabs within a byte budget
+
+    Slabs are keyed by (owner, slab path) so that one cache can be shared
+    by multiple open slab files.
+    """
+
+    def __init__(self, budget=CACHE_SIZE):
+
+        self.budget = budget
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._slabs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, owner, path):
+
+        with self._lock:
+            item = self._slabs.get((owner, path), None)
+
+            if item is None:
+                self.misses += 1
+                return None
+
+            self._slabs.move_to_end((owner, path))
+            self.hits += 1
+
+            return item[0]
+
+    def has(self, owner, path):
+
+        return (owner, path) in self._slabs
+
+    def put(self, owner, path, slab, nbytes):
+
+        with self._lock:
+            if (owner, path) in self._slabs:
+                self.nbytes -= self._slabs.pop((owner, path))[1]
+
+            if nbytes > self.budget:
+                return
+
+            self._slabs[(owner, path)] = (slab, nbytes)
+            self.nbytes += nbytes
+
+            while self.nbytes > self.budget:
+                _, (_, _nbytes) = self._slabs.popitem(last=False)
+                self.nbytes -= _nbytes
+                self.evictions += 1
+
+    def clear(self, owner=None):
+
+        with self._lock:
+            if owner is None:
+                self._slabs.clear()
+                self.nbytes = 0
+                return
+
+            for key in [k for k in self._slabs if k[0] is owner]:
+                self.nbytes -= self._slabs.pop(key)[1]
+
+    def info(self):
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "count": len(self._slabs),
+            "nbytes": self.nbytes,
+            "budget": self.budget
+        }
+
+
+_shared_cache = None
+
+
+def shared_cache(budget=None):
+    """return the process-wide slab cache"""
+
+    global _shared_cache
+
+    if _shared_cache is None:
+        _shared_cache = SlabCache(CACHE_SIZE if budget is None else budget)
+
+    elif budget is not None:
+        _shared_cache.budget = budget
+
+    return _shared_cache
+
+
+def get_cache(cache, budget):
+
+    if cache is None:
+        return SlabCache(budget)
+
+    if cache == "shared":
+        if _shared_cache is None:
+            return shared_cache(budget)
+
+        # the shared cache keeps the largest budget of the open files
+        with _shared_cache._lock:
+            _shared_cache.budget = max(_shared_cache.budget, budget)
+
+        return _shared_cache
+
+    return cache
@@ -1,10 +1,13 @@
 """main entry for pyslabs command-line interface"""
 
+import sys, argparse
 import pyslabs
 
+from pyslabs.error import PE_Config_Pickled
+
 def cmd_info(args):
 
-    with pyslabs.open(args.slabfile) as fp:
+    with pyslabs.open(args.slabfile, allow_pickle=args.allow_pickle) as fp:
 
         if args.list:
             print(", ".join(fp.info("list", verbose=args.verbose)))
@@ -19,7 +22,12 @@ def cmd_info(args):
                 print("    min bytes: %d" % m) 
 
         elif args.var:
-            var = fp.info("var", args.var, verbose=args.verbose)
+            print(args.var)
+            for k, v in fp.info("var", args.var, verbose=args.verbose).items():
+                if k == "shape":
+                    v = "(%s)" % ", ".join([str(s) for s in v])
+
+                print("%13s: %s" % (k, v))
 
         else:
             # TODO : add slab (shape, type, number)
@@ -40,8 +48,59 @@ def cmd_info(args):
                     print("vars: " + ", ".join(buf))
                    
 
+def cmd_verify(args):
+
+    with pyslabs.open(args.slabfile, allow_pickle=args.allow_pickle) as fp:
+        failed = fp.verify(workers=args.workers)
+
+    for arcname, reason in failed:
+        print("%s: %s" % (arcname, reason))
+
+    if failed:
+        print("%d slab(s) failed verification." % len(failed))
+        return 1
+
+    print("All slabs are verified.")
+    return 0
+
+
+def _lengths(allow_empty):
+    """argument type of comma-separated positive lengths"""
+
+    def _parse(text):
+
+        lengths = []
+
+        for t in text.split(","):
+            if not t and allow_empty:
+                lengths.append(None)
+
+            elif t.isdigit() and int(t) > 0:
+                lengths.append(int(t))
+
+            else:
+                raise argparse.ArgumentTypeError("positive integers "
+                                                 "expected: %s" % text)
+
+        return tuple(lengths)
+
+    return _parse
+
+
+def cmd_rechunk(args):
+
+    var_names = None if args.vars is None else args.vars.split(",")
+
+    pyslabs.rechunk(args.slabfile, args.outfile, tiles=args.tiles,
+                    levels_per_slab=args.levels_per_slab, var_names=var_names,
+                    workers=args.workers, pencils=args.pencils,
+                    allow_pickle=args.allow_pickle)
+
+    print("Rechunked to %s." % args.outfile)
+    return 0
+
+
 def main():
-    import argparse
     from pyslabs.const import version
 
     parser = argparse.ArgumentParser(description="pyslabs command-line tool")
@@ -56,9 +115,40 @@ def main():
     p_info.add_argument("-l", "--list", action="store_true", help="a list of variables")
     p_info.add_argument("-v", "--var", help="variable info")
     p_info.add_argument("-s", "--slab", action="store_true", help="slab info")
+    p_info.add_argument("--allow-pickle", action="store_true",
+                        help="open a trusted file of an older version")
     p_info.set_defaults(func=cmd_info)
 
+    p_verify = cmds.add_parser('verify')
+    p_verify.add_argument("slabfile", help="slabfile path")
+    p_verify.add_argument("-w", "--workers", type=int, help="number of threads")
+    p_verify.add_argument("--allow-pickle", action="store_true",
+                          help="open a trusted file of an older version")
+    p_verify.set_defaults(func=cmd_verify)
+
+    p_rechunk = cmds.add_parser('rechunk')
+    p_rechunk.add_argument("slabfile", help="input slabfile path")
+    p_rechunk.add_argument("outfile", help="output slabfile path")
+    p_rechunk.add_argument("-t", "--tiles", type=_lengths(True),
+                           help="comma-separated slab lengths of non-stack "
+                           "dimensions; empty for one tile")
+    p_rechunk.add_argument("-n", "--levels-per-slab", type=int, default=1,
+                           help="stack levels per slab")
+    p_rechunk.add_argument("--vars", help="comma-separated variable names")
+    p_rechunk.add_argument("-p", "--pencils", type=_lengths(False),
+                           help="comma-separated pencil lengths of non-stack "
+                           "dimensions")
+    p_rechunk.add_argument("-w", "--workers", type=int, help="number of threads")
+    p_rechunk.add_argument("--allow-pickle", action="store_true",
+                           help="open a trusted file of an older version")
+    p_rechunk.set_defaults(func=cmd_rechunk)
+
     argps = parser.parse_args()
-    argps.func(argps)
 
-    return 0
+    try:
+        return argps.func(argps) or 0
+
+    except PE_Config_Pickled:
+        print("%s: pickled config of an older version; use --allow-pickle "
+              "if the file is trusted" % argps.slabfile, file=sys.stderr)
+        return 1
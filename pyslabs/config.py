@@ -0,0 +1,114 @@
+"""Pyslabs config module
+
+The config of a slab file is a small JSON header followed by one JSON
+section per variable. Variable sections are decoded at the first access.
+As in JSON, tuples are read back as lists and non-string dict keys as
+strings.
+"""
+
+import os, io, json, pickle
+
+from collections.abc import Mapping
+from pyslabs.const import CONFIG_MAGIC
+from pyslabs.error import PE_Config_Notserializable, PE_Config_Pickled
+
+
+def _default(obj):
+
+    # numpy arrays and scalars
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+
+    raise TypeError("%s is not JSON serializable" % type(obj).__name__)
+
+
+def _encode(obj):
+
+    try:
+        return json.dumps(obj, default=_default,
+                          separators=(",", ":")).encode("utf-8")
+
+    except (TypeError, ValueError) as err:
+        raise PE_Config_Notserializable(str(err))
+
+
+def check_serializable(obj):
+    """raise PE_Config_Notserializable if obj can not be stored in config"""
+
+    _encode(obj)
+
+
+class LazyVars(Mapping):
+
+    def __init__(self, sections, data):
+
+        self._sections = sections
+        self._data = data
+        self._decoded = {}
+
+    def __getitem__(self, name):
+
+        if name not in self._decoded:
+            offset, length = self._sections[name]
+            section = self._data[offset:offset+length]
+            self._decoded[name] = json.loads(bytes(section).decode("utf-8"))
+
+        return self._decoded[name]
+
+    def __iter__(self):
+        return iter(self._sections)
+
+    def __len__(self):
+        return len(self._sections)
+
+    def __contains__(self, name):
+        return name in self._sections
+
+    def ndecoded(self):
+        return len(self._decoded)
+
+
+def dump_config(path, config):
+
+    sections = []
+    offsets = {}
+    offset = 0
+
+    for name, var_cfg in config["vars"].items():
+        section = _encode(var_cfg)
+        offsets[name] = (offset, len(section))
+        offset += len(section)
+        sections.append(section)
+
+    header = dict((k, v) for k, v in config.items() if k != "vars")
+    header["vars"] = offsets
+
+    with io.open(path, "wb") as fp:
+        fp.write(CONFIG_MAGIC)
+        fp.write(_encode(header))
+        fp.write(b"\n")
+
+        for section in sections:
+            fp.write(section)
+
+        fp.flush()
+        os.fsync(fp.fileno())
+
+
+def load_config(fp, allow_pickle=False):
+
+    data = fp.read()
+
+    # config of older slab files is a pickled dict that can run code
+    if not data.startswith(CONFIG_MAGIC):
+        if not allow_pickle:
+            raise PE_Config_Pickled("open a trusted slab file of an older "
+                                    "version with allow_pickle=True")
+
+        return pickle.loads(data)
+
+    pos = data.index(b"\n", len(CONFIG_MAGIC))
+    config = json.loads(data[len(CONFIG_MAGIC):pos].decode("utf-8"))
+    config["vars"] = LazyVars(config["vars"], memoryview(data)[pos+1:])
+
+    return config
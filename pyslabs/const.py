@@ -15,8 +15,26 @@ INIT_TIMEOUT        = 10      # seconds
 FINI_TIMEOUT        = 100     # seconds
 SLAB_EXT            = ".slab" # slab file extension
 ZLAB_EXT            = ".zlab" # compressed slab file extension
+SHARD_MAXOPEN       = 8       # max. number of open shard files per reader
+VERIFY_BLOCKSIZE    = 4194304 # bytes per read in checksum verification
+CACHE_SIZE          = 268435456 # default byte budget of a slab cache
+NPY_HEADER_SIZE     = 4096    # bytes to read for a npy header
+READ_WORKERS        = 4       # default number of slab-read threads
+READAHEAD           = 0       # stack levels to prefetch on sequential reads
+OOB_MINSIZE         = 65536   # min. bytes of out-of-band pickle buffers
+OOB_ALIGN           = 64      # alignment of out-of-band pickle buffers
+NPC_ALIGN           = 64      # alignment of columnar field payloads
+REDUCE_OPS          = ("sum", "mean", "min", "max", "var", "count")
+OVERVIEW_PREFIX     = "_ov"   # name prefix of hidden overview variables
+PENCIL_PREFIX       = "_pc"   # name prefix of hidden pencil variables
+PENCIL_TILE         = 8       # default pencil length per non-stack dimension
+PENCIL_BUFSIZE      = 268435456 # byte budget of stack levels per pencil slab
 
 CONFIG_FILE         = "_config_"
+CONFIG_MAGIC        = b"PYSLABS_CONFIG_V1\n" # leading bytes of JSON config
+TYPED_MAGIC         = b"PYSLABS_TYPED_V1\n"  # leading bytes of typed slabs
+OOB_MAGIC           = b"PYSLABS_PICKLE5_V1\n" # leading bytes of pickle5 slabs
+NPC_MAGIC           = b"PYSLABS_COLUMNS_V1\n" # leading bytes of columnar slabs
 FINISH_FILE         = "_finished_"
 VARCFG_FILE         = "_varcfg_"
 
@@ -0,0 +1,90 @@
+"""Pyslabs coordinate module
+
+Coordinate values of a dimension are origin + index * unit or, if the
+dimension is defined with points, the points themselves.
+"""
+
+import math
+import numpy as np
+
+from pyslabs.error import PE_Sel_Notfound, PE_Sel_Unknownmethod
+
+
+def _arithmetic(dim_cfg):
+
+    origin = dim_cfg.get("origin", None)
+    unit = dim_cfg.get("unit", None)
+    origin = 0 if not origin else origin[0]
+    step = 1 if not unit or unit[0] is None else unit[0]
+
+    return origin, step
+
+
+def _index(dim_cfg, points, value, length, method):
+
+    if points is None:
+        origin, step = _arithmetic(dim_cfg)
+        pos = (value - origin) / float(step)
+        idx = min(max(int(math.floor(pos + 0.5)), 0), length - 1)
+        exact = abs(pos - idx) < 1e-9
+
+    else:
+        ascending = len(points) < 2 or points[0] <= points[-1]
+        coords = points if ascending else points[::-1]
+        right = int(np.searchsorted(coords, value))
+        left = max(right - 1, 0)
+        right = min(right, length - 1)
+        idx = (left if abs(coords[left] - value) <= abs(coords[right] - value)
+               else right)
+        exact = coords[idx] == value
+        idx = idx if ascending else length - 1 - idx
+
+    if method is None and not exact:
+        raise PE_Sel_Notfound(str(value))
+
+    return idx
+
+
+def _range(dim_cfg, points, lo, hi, length):
+
+    if lo is None:
+        lo = -np.inf
+
+    if hi is None:
+        hi = np.inf
+
+    if points is None:
+        origin, step = _arithmetic(dim_cfg)
+        a, b = (lo - origin) / float(step), (hi - origin) / float(step)
+        start = int(math.ceil(max(min(a, b), 0) - 1e-9))
+        stop = int(math.floor(min(max(a, b), length) + 1e-9)) + 1
+        stop = min(stop, length)
+
+    else:
+        ascending = len(points) < 2 or points[0] <= points[-1]
+        coords = points if ascending else points[::-1]
+        start = int(np.searchsorted(coords, lo, side="left"))
+        stop = int(np.searchsorted(coords, hi, side="right"))
+
+        if not ascending:
+            start, stop = length - stop, length - start
+
+    return slice(start, max(start, stop))
+
+
+def coord_key(dim_cfg, value, length, method=None, points=None):
+    """return an index or a slice of a coordinate value or (low, high)
+
+    points is the numpy array of the points of the dimension, if any.
+    """
+
+    if method not in (None, "nearest"):
+        raise PE_Sel_Unknownmethod(str(method))
+
+    if isinstance(value, slice):
+        return _range(dim_cfg, points, value.start, value.stop, length)
+
+    if isinstance(value, (tuple, list)):
+        return _range(dim_cfg, points, value[0], value[1], length)
+
+    return _index(dim_cfg, points, value, length, method)
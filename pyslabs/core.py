@@ -9,18 +9,27 @@ name : does not include directory path
 
 """
 
-import os, sys, io, copy, time, uuid, pickle, shutil, tarfile
+import os, sys, io, copy, time, uuid, pickle, shutil, tarfile, threading
 
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pyslabs.const import (SLAB_EXT, ZLAB_EXT, TMP_BEGIN, TMP_WORK, INIT_BEGIN,
                            INIT_CONFIG, INIT_VARCFG, INIT_DIMCFG, CONFIG_FILE,
                            FINISH_FILE, INIT_TIMEOUT, FINI_TIMEOUT, VARCFG_FILE,
-                           UNLIMITED)
+                           UNLIMITED, SHARD_MAXOPEN, CACHE_SIZE, READ_WORKERS,
+                           READAHEAD)
 from pyslabs.error import PE_Begin_Numproc, PE_Close_Startindexerror, PE_Close_Shapemismatch
-from pyslabs.util import pickle_dump, clean_folder
-from pyslabs.write import VariableWriterV1
-from pyslabs.read import VariableReaderV1
-from pyslabs.slabif import _cache
+from pyslabs.error import PE_Read_Nooverview
+from pyslabs.util import pickle_dump, clean_folder, slab_levels
+from pyslabs.shard import (ShardMember, ShardPool, check_policy, write_shards)
+from pyslabs.config import dump_config, load_config, check_serializable
+from pyslabs.write import VariableWriterV1, check_layout
+from pyslabs.read import VariableReaderV1, normalize_key, to_key
+from pyslabs.mapper import map_slabs
+from pyslabs.overview import (check_overviews, build_overviews, overview_sels,
+                              is_overview)
+from pyslabs.pencil import check_pencils, build_pencils, is_pencil
+from pyslabs.cache import get_cache
 
 
 ##############################
@@ -134,7 +143,10 @@ class PyslabsWriterV1(object):
 # master implementation of pyslabs 
 class MasterPyslabsWriterV1(PyslabsWriterV1):
 
-    def get_writer(self, name, shape=None, autostack=False, **kwargs):
+    def get_writer(self, name, shape=None, autostack=False, layout=None,
+                   stats=False, ranges=False, overviews=None,
+                   overview_method="mean", pencils=None, pencil_levels=None,
+                   **kwargs):
 
         var_cfg = copy.deepcopy(INIT_VARCFG)
 
@@ -163,9 +175,29 @@ class MasterPyslabsWriterV1(PyslabsWriterV1):
 
         var_cfg["check"]["shape"] = shape
         var_cfg["stack"]["auto"] = autostack
+
+        if layout is not None:
+            var_cfg["layout"] = check_layout(layout)
+
+        if stats:
+            var_cfg["stats"] = True
+
+        if ranges:
+            var_cfg["ranges"] = True
+
+        if overviews:
+            var_cfg["overviews"] = check_overviews(overviews, overview_method)
+
+        if pencils:
+            var_cfg["pencils"] = check_pencils(pencils, pencil_levels,
+                                               var_cfg.get("layout", None))
+
         var_cfg["attrs"].update(dict((k[5:],v) for k,v in kwargs.items() if
                                 k.startswith("attr_")))
 
+        # fail before any slab is written rather than at close
+        check_serializable(var_cfg["attrs"])
+
         self.config["vars"][name] = var_cfg
 
         return VariableWriterV1(os.path.join(self.proc_path, name), var_cfg)
@@ -197,6 +229,7 @@ class MasterPyslabsWriterV1(PyslabsWriterV1):
         dim_cfg["desc"] = desc
         dim_cfg["attrs"] = dict((k[5:],v) for k,v in kwargs.items() if
                                 k.startswith("attr_"))
+        check_serializable(dim_cfg)
 
         self.config["dims"][name] = dim_cfg
 
@@ -334,7 +367,9 @@ class MasterPyslabsWriterV1(PyslabsWriterV1):
                     raise PE_Close_DestDupulicated(dst_path)
 
                 else:
-                    nslabs = 1 if nslabs is None else nslabs + 1
+                    # a slab may hold several stack levels
+                    nlevels = slab_levels(idx_len)[1]
+                    nslabs = nlevels if nslabs is None else nslabs + nlevels
                     shutil.move(src_path, dst_path)
 
             if nslabs is not None:
@@ -470,6 +505,13 @@ class MasterPyslabsWriterV1(PyslabsWriterV1):
             var_cfg["shape"] = shape[name]
             var_cfg.pop("writes")
 
+            # merge slab manifests of all procs
+            manifest = {}
+            for cfg in attrs["vars"][name]["config"]:
+                manifest.update(cfg["writes"])
+
+            var_cfg["manifest"] = manifest
+
             if var_cfg["check"]:
                 # check exists if shape arg is given
                 for check in var_cfg["check"].keys(): 
@@ -509,16 +551,52 @@ class MasterPyslabsWriterV1(PyslabsWriterV1):
 
                 var_cfg.pop("check")
 
+        # downsampled overviews and transposed pencils are stored as
+        # hidden variables
+        for name in list(self.config["vars"].keys()):
+            var_cfg = self.config["vars"][name]
+            lengths = [self.config["dims"][l]["length"] if l in
+                       self.config["dims"] else l for l in var_cfg["shape"]]
+
+            if "overviews" in var_cfg:
+                self.config["vars"].update(build_overviews(self.work_path,
+                                           name, var_cfg, lengths))
+
+            if "pencils" in var_cfg:
+                self.config["vars"].update(build_pencils(self.work_path,
+                                           name, var_cfg, lengths))
+
         slab_path = self.config["_control_"]["slab_path"]
+        shard = self.config["_control_"].get("shard", None)
 
         self.config.pop("_control_")
 
-        pickle_dump(self.cfg_path, self.config)
+        if shard is None:
+            dump_config(self.cfg_path, self.config)
 
-        with tarfile.open(slab_path, "w") as tar:
-            for item in os.listdir(self.work_path):
-                item_path = os.path.join(self.work_path, item)
-                tar.add(item_path, arcname=item)
+            with tarfile.open(slab_path, "w") as tar:
+                for item in os.listdir(self.work_path):
+                    item_path = os.path.join(self.work_path, item)
+                    tar.add(item_path, arcname=item)
+
+        else:
+            # slab members go to shard files and the slab file keeps
+            # the config only as a top-level manifest
+            shards = write_shards(slab_path, self.work_path, shard,
+                                  exclude=(CONFIG_FILE,))
+
+            # shard locations are kept in the section of each variable
+            for arcname, member in shards.pop("members").items():
+                name, path = arcname.split("/", 1)
+                var_cfg = self.config["vars"][name]
+                var_cfg.setdefault("members", {})[path] = member
+
+            self.config["shards"] = shards
+
+            dump_config(self.cfg_path, self.config)
+
+            with tarfile.open(slab_path, "w") as tar:
+                tar.add(self.cfg_path, arcname=CONFIG_FILE)
 
         try:
             shutil.rmtree(self.work_path)
@@ -563,23 +641,66 @@ class ParallelPyslabsWriterV1(PyslabsWriterV1):
 
 class PyslabsReaderV1():
 
-    def __init__(self, slab_path):
+    def __init__(self, slab_path, maxopen=SHARD_MAXOPEN, verify=False,
+                 cache=None, cache_size=CACHE_SIZE, workers=READ_WORKERS,
+                 readahead=READAHEAD, allow_pickle=False):
         self.slab_path = slab_path
+        self.allow_pickle = allow_pickle
         self.tar_file = tarfile.open(slab_path, mode="r:")
         self.slab_tower = OrderedDict()
+        self._readers = {}
 
         tower = {}
 
         for entry in self.tar_file:
             if entry.name == CONFIG_FILE:
-                self.config = pickle.load(self.tar_file.extractfile(entry))
+                self.config = load_config(self.tar_file.extractfile(entry),
+                                          allow_pickle=allow_pickle)
 
             else:
                 self._trie(tower, entry.path.split("/"), entry)
 
+        if "shards" in self.config:
+            # towers of sharded variables are built in _var_tower
+            slab_dir = os.path.dirname(os.path.abspath(slab_path))
+            paths = [os.path.join(slab_dir, f) for f in
+                     self.config["shards"]["files"]]
+
+        else:
+            paths = [slab_path]
+
+        # shard files are opened lazily at the first slab read
+        self.slab_pool = ShardPool(paths, maxopen=maxopen)
+        self.cache = get_cache(cache, cache_size)
+        self.readahead = readahead
+
+        # threads that fetch and decode slabs of a query
+        self.workers = workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+        if verify:
+            # checksums are registered per variable in get_reader
+            self.slab_pool.checksums = {}
+
         self._sort_tower(self.slab_tower, tower)
 
 
+    def _var_tower(self, name):
+
+        if name not in self.slab_tower and "shards" in self.config:
+            tower = {}
+            members = self.config["vars"][name].get("members", {})
+
+            for path, (shard, offset, size) in members.items():
+                member = ShardMember(name+"/"+path, shard, offset, size)
+                self._trie(tower, path.split("/"), member)
+
+            self.slab_tower[name] = OrderedDict()
+            self._sort_tower(self.slab_tower[name], tower)
+
+        return self.slab_tower[name]
+
     def _sort_tower(self, dst, src):
 
         for key in sorted(src.keys()):
@@ -617,31 +738,185 @@ class PyslabsReaderV1():
             output[entry_path[0]] = _output
             self._trie(_output, entry_path[1:], entry)
 
+    def _get_executor(self):
+
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers)
+
+        return self._executor
+
     def get_reader(self, name):
 
+        # readers keep tile indices and npy headers across queries
+        if name in self._readers:
+            return self._readers[name]
+
         varcfg = self.config["vars"][name]
         dimcfg = self.config["dims"]
 
-        return VariableReaderV1(self.tar_file, self.slab_tower[name],
-                varcfg, dimcfg)
+        if self.slab_pool.checksums is not None:
+            for path, write in varcfg.get("manifest", {}).items():
+                if "crc32" in write:
+                    self.slab_pool.checksums[name+"/"+path] = write["crc32"]
+
+        reader = VariableReaderV1(self.slab_pool, self._var_tower(name),
+                varcfg, dimcfg, cache=self.cache, executor=self._get_executor,
+                readahead=self.readahead, workers=self.workers)
+        self._readers[name] = reader
+
+        # the reader chooses between the slabs and their pencils per query
+        pcname = varcfg.get("pencils", {}).get("var", None)
 
-    def get_array(self, name, stack=None):
+        if pcname in self.config["vars"]:
+            reader.pencils = self.get_reader(pcname)
+
+        return reader
+
+    def get_array(self, name, stack=None, out=None, overview=None,
+                  target=None):
+        """read a variable or, with overview or target, its overview
+
+        overview k selects the k-th overview factor (0 is the variable).
+        target chooses the finest overview whose output has at most
+        target elements. stack is in the coordinates of the variable.
+        """
 
         if stack is None:
-            return self.get_reader(name)[:]
+            stack = slice(None)
 
-        elif isinstance(stack, (int, slice)):
-            return self.get_reader(name).__getitem__(stack)
+        reader = self.get_reader(name)
 
-        else:
-            return self.get_reader(name).__getitem__(*stack)
+        if not overview and target is None:
+            return reader.get_array(stack, out=out)
+
+        options = reader.var_cfg.get("overviews", None)
+
+        if options is None or not options.get("vars", None):
+            raise PE_Read_Nooverview(name)
+
+        factors = [f for f in options["factors"] if str(f) in options["vars"]]
+        sels = normalize_key(stack, reader.shape)
+
+        if overview is None:
+            overview = 0
+            mapped = sels
+
+            while overview < len(factors):
+                size = 1
+
+                for sel in mapped:
+                    size *= 1 if isinstance(sel, int) else len(sel)
+
+                if size <= target:
+                    break
 
+                overview += 1
+                mapped = overview_sels(sels, factors[overview-1])
+
+        elif overview < 0 or overview > len(factors):
+            raise PE_Read_Nooverview("%s: %d" % (name, overview))
+
+        if overview == 0:
+            return reader.get_array(stack, out=out)
+
+        factor = factors[overview-1]
+        ovreader = self.get_reader(options["vars"][str(factor)])
+
+        return ovreader.get_array(to_key(overview_sels(sels, factor)),
+                                  out=out)
+
+    def reduce(self, name, op, axis=None, key=slice(None)):
+
+        return self.get_reader(name).reduce(op, axis=axis, key=key)
+
+    def map_slabs(self, name, func, key=slice(None), workers=None,
+                  assemble=False, chunksize=1):
+
+        return map_slabs(self, name, func, key=key, workers=workers,
+                         assemble=assemble, chunksize=chunksize)
+
+    def sel(self, name, method=None, **coords):
+
+        return self.get_reader(name).sel(method=method, **coords)
+
+    def stats(self, name, key=slice(None)):
+
+        return self.get_reader(name).stats(key=key)
+
+    def where(self, name, predicate, key=slice(None)):
+
+        return self.get_reader(name).where(predicate, key=key)
+
+    def select_levels(self, name, predicate, key=slice(None)):
+
+        return self.get_reader(name).select_levels(predicate, key=key)
+
+
+    def _member(self, arcname):
+
+        names = arcname.split("/")
+
+        if names[0] not in self.config["vars"]:
+            return None
+
+        member = self._var_tower(names[0])
+
+        for name in names[1:]:
+            if not isinstance(member, dict) or name not in member:
+                return None
+
+            member = member[name]
+
+        return member
+
+    def verify(self, workers=None):
+        """check crc32 of all slabs and return a list of failed slabs"""
+
+        def _check(item):
+
+            arcname, crc32 = item
+            member = self._member(arcname)
+
+            if member is None:
+                return arcname, "missing"
+
+            if self.slab_pool.checksum(member) != crc32:
+                return arcname, "checksum mismatch"
+
+        checks = []
+
+        for name, varcfg in self.config["vars"].items():
+            for path, write in varcfg.get("manifest", {}).items():
+                if "crc32" in write:
+                    checks.append((name+"/"+path, write["crc32"]))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return [f for f in executor.map(_check, checks) if f is not None]
+
+    def cache_clear(self):
+
+        self.cache.clear(self.slab_pool)
+
+    def cache_info(self):
+
+        return self.cache.info()
 
     def close(self):
 
         if not self.tar_file.closed:
             self.tar_file.close()
 
+        for reader in self._readers.values():
+            reader.close()
+
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+        self.cache_clear()
+        self.slab_pool.close()
+
     def __enter__(self):
         return self
 
@@ -667,21 +942,21 @@ class PyslabsReaderV1():
     def info(self, mode, *args, **kwargs):
 
         if mode == "list":
-            return tuple(self.slab_tower.keys())
+            return tuple(sorted(n for n in self.config["vars"].keys() if
+                                not is_overview(n) and not is_pencil(n)))
 
         elif mode == "var":
-            out = {}
-            var = self.get_reader(args[0])
-
-            import pdb; pdb.set_trace()
+            return self.get_reader(args[0]).info()
 
         elif mode == "slab":
             out = {}
-            bag = {"check": lambda k, v: isinstance(v, tarfile.TarInfo),
+            bag = {"check": lambda k, v: isinstance(v, (tarfile.TarInfo,
+                                                    ShardMember)),
                     "output": lambda k, v: v}
 
-            for var, tree in self.slab_tower.items():
+            for var in sorted(self.config["vars"].keys()):
 
+                tree = self._var_tower(var)
                 data = []
                 bag["data"] = data
                 self._traverse(tree, bag)
@@ -719,13 +994,22 @@ class PyslabsReaderV1():
 
             vbuf = []
             for n, v in self.config["vars"].items():
+                if is_overview(n) or is_pencil(n):
+                    continue
+
                 if "shape" in v:
                     vbuf.append((n, v["shape"]))
                 else:
                     vbuf.append((n, None))
 
             out.append(("vars", tuple(vbuf)))
-            out.append(("size", os.path.getsize(self.slab_path)))
+            size = os.path.getsize(self.slab_path)
+
+            for path in self.slab_pool.paths:
+                if path != self.slab_path:
+                    size += os.path.getsize(path)
+
+            out.append(("size", size))
 
             return out
 
@@ -744,10 +1028,15 @@ class MasterPyslabsReaderV1(PyslabsReaderV1):
 
 
 # open slab I/O for master process
-def master_open(slab_path, num_procs, mode="w", workdir=None):
+def master_open(slab_path, num_procs, mode="w", workdir=None, shard=None,
+                maxopen=SHARD_MAXOPEN, verify=False, cache=None,
+                cache_size=CACHE_SIZE, workers=READ_WORKERS,
+                readahead=READAHEAD, allow_pickle=False):
 
     if mode == "w":
 
+        shard = check_policy(shard)
+
         slab_path, begin_path, work_path = _write_paths(slab_path, workdir)
 
         # create root directory
@@ -769,26 +1058,30 @@ def master_open(slab_path, num_procs, mode="w", workdir=None):
         config["_control_"]["num_procs"] = num_procs
         config["_control_"]["begin_path"] = begin_path
         config["_control_"]["slab_path"] = slab_path
+        config["_control_"]["shard"] = shard
 
         return MasterPyslabsWriterV1(work_path, config)
 
     elif mode == "r":
 
-        _cache.clear()
-
         if num_procs is not None and num_procs > 1:
             print("ERROR: parallel-read is not supported, but 'num_procs' "
                   "argument is larger than one: %d" % num_procs)
             sys.exit(-1)
 
-        return MasterPyslabsReaderV1(slab_path)
+        return MasterPyslabsReaderV1(slab_path, maxopen=maxopen,
+                    verify=verify, cache=cache, cache_size=cache_size,
+                    workers=workers, readahead=readahead,
+                    allow_pickle=allow_pickle)
 
     else:
         raise PE_Open_Unknownmode(mode)
 
 
 # open slab I/O for non-master processes
-def parallel_open(slab_path, mode="w"):
+def parallel_open(slab_path, mode="w", maxopen=SHARD_MAXOPEN, verify=False,
+                  cache=None, cache_size=CACHE_SIZE, workers=READ_WORKERS,
+                  readahead=READAHEAD, allow_pickle=False):
 
     if mode == "w":
 
@@ -828,13 +1121,28 @@ def parallel_open(slab_path, mode="w"):
         return ParallelPyslabsWriterV1(work_path, config)
 
     elif mode == "r":
-        return ParallelPyslabsReaderV1(slab_path)
+        return ParallelPyslabsReaderV1(slab_path, maxopen=maxopen,
+                    verify=verify, cache=cache, cache_size=cache_size,
+                    workers=workers, readahead=readahead,
+                    allow_pickle=allow_pickle)
 
     else:
         raise PE_Open_Unknownmode(mode)
 
 
 # the wrapper of "master_open" for convinience
-def open(slab_path, mode="r", num_procs=1, workdir=None):
-
-    return master_open(slab_path, num_procs, mode=mode, workdir=workdir)
+def open(slab_path, mode="r", num_procs=1, workdir=None, shard=None,
+         maxopen=SHARD_MAXOPEN, verify=False, cache=None,
+         cache_size=CACHE_SIZE, workers=READ_WORKERS, readahead=READAHEAD,
+         allow_pickle=False):
+    """open a slab file
+
+    allow_pickle loads the pickled config of a slab file of an older
+    version. It does not make untrusted files safe to read: builtin
+    slabs in pickle format are unpickled at every read regardless.
+    """
+
+    return master_open(slab_path, num_procs, mode=mode, workdir=workdir,
+                       shard=shard, maxopen=maxopen, verify=verify,
+                       cache=cache, cache_size=cache_size, workers=workers,
+                       readahead=readahead, allow_pickle=allow_pickle)
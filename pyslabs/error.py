@@ -43,10 +43,82 @@ class PE_Write_Duplicateslabfile(Pyslabs_Error):
     pass
 
 
+class PE_Write_Unknownlayout(Pyslabs_Error):
+    pass
+
+
+class PE_Write_Unknownoverview(Pyslabs_Error):
+    pass
+
+
+class PE_Write_Unknownpencil(Pyslabs_Error):
+    pass
+
+
+class PE_Write_Notstackable(Pyslabs_Error):
+    pass
+
+
+class PE_Rechunk_Invalidtiles(Pyslabs_Error):
+    pass
+
+
 class PE_Read_Exeedlength(Pyslabs_Error):
     pass
 
 
+class PE_Read_Checksummismatch(Pyslabs_Error):
+    pass
+
+
+class PE_Read_Invalidkey(Pyslabs_Error):
+    pass
+
+
+class PE_Read_Outshape(Pyslabs_Error):
+    pass
+
+
+class PE_Read_Unknownfield(Pyslabs_Error):
+    pass
+
+
+class PE_Read_Invalidpredicate(Pyslabs_Error):
+    pass
+
+
+class PE_Read_Nooverview(Pyslabs_Error):
+    pass
+
+
+class PE_Read_Missingslab(Pyslabs_Error):
+    pass
+
+
+class PE_Sel_Unknowndim(Pyslabs_Error):
+    pass
+
+
+class PE_Sel_Notfound(Pyslabs_Error):
+    pass
+
+
+class PE_Sel_Unknownmethod(Pyslabs_Error):
+    pass
+
+
+class PE_Reduce_Unknownop(Pyslabs_Error):
+    pass
+
+
+class PE_Reduce_Invalidaxis(Pyslabs_Error):
+    pass
+
+
+class PE_Slabif_Negativestep(Pyslabs_Error):
+    pass
+
+
 class PE_Stabif_Typemismatch(Pyslabs_Error):
     pass
 
@@ -59,3 +131,17 @@ class PE_Close_Startindexerror(Pyslabs_Error):
     pass
 
 
+class PE_Shard_Unknownpolicy(Pyslabs_Error):
+    pass
+
+
+class PE_Shard_Outofrange(Pyslabs_Error):
+    pass
+
+
+class PE_Config_Notserializable(Pyslabs_Error):
+    pass
+
+
+class PE_Config_Pickled(Pyslabs_Error):
+    pass
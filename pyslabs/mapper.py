@@ -0,0 +1,93 @@
+"""Pyslabs slab mapper module
+
+Worker processes open the slab file themselves and read the slabs of
+their tasks only; the master process ships keys and results.
+"""
+
+import multiprocessing
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+from pyslabs.read import normalize_key
+
+_worker = {}
+
+
+def _init_worker(slab_path, options):
+
+    import pyslabs
+
+    _worker["slabs"] = pyslabs.open(slab_path, **options)
+
+
+def _run(name, func, key, offset):
+
+    reader = _worker["slabs"].get_reader(name)
+
+    return func(reader.get_array(key), offset)
+
+
+def _results(slabs, name, func, tasks, workers, chunksize):
+
+    if workers is None or workers < 2:
+        reader = slabs.get_reader(name)
+
+        for key, offset, _ in tasks:
+            yield func(reader.get_array(key), offset)
+
+        return
+
+    # workers read with their own slab cache and no read threads
+    options = {"workers": 1, "readahead": 0,
+               "verify": slabs.slab_pool.checksums is not None,
+               "allow_pickle": slabs.allow_pickle}
+
+    # spawned workers do not inherit threads or open files of the master
+    context = multiprocessing.get_context("spawn")
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                   initializer=_init_worker,
+                                   initargs=(slabs.slab_path, options))
+
+    try:
+        for result in executor.map(_run, [name] * len(tasks),
+                                   [func] * len(tasks),
+                                   [t[0] for t in tasks],
+                                   [t[1] for t in tasks],
+                                   chunksize=chunksize):
+            yield result
+
+    finally:
+        executor.shutdown()
+
+
+def map_slabs(slabs, name, func, key=slice(None), workers=None,
+              assemble=False, chunksize=1):
+    """apply func(block, offset) to slab-aligned blocks of a selection
+
+    offset is the global index of the first element of a block in the
+    order of the output, per dimension; the index decreases along a
+    dimension of a negative step. func is called in spawned worker
+    processes if workers > 1, so it must be importable by name.
+    Returns an iterator of (offset, result) in the order of the blocks
+    or, with assemble, one array of the shape of the selection.
+    """
+
+    reader = slabs.get_reader(name)
+    tasks = reader._map_tasks(key)
+    results = _results(slabs, name, func, tasks, workers, chunksize)
+
+    if not assemble:
+        return ((offset, result) for (_, offset, _), result in
+                zip(tasks, results))
+
+    sels = normalize_key(key, reader.shape)
+    out_shape = tuple(len(s) for s in sels if not isinstance(s, int))
+    out = None
+
+    for (_, _, dst), result in zip(tasks, results):
+        if out is None:
+            out = np.empty(out_shape, dtype=np.asarray(result).dtype)
+
+        out[dst] = result
+
+    return out
@@ -0,0 +1,153 @@
+"""Pyslabs overview module
+
+Overviews are downsampled copies of a variable that are built from its
+slabs at close and stored as hidden variables. An overview tile keeps the
+blocks of factor elements whose first index is in the source tile.
+"""
+
+import os
+import numpy as np
+
+from pyslabs import slabif_numpy as npif
+from pyslabs.const import OVERVIEW_PREFIX
+from pyslabs.error import PE_Write_Unknownoverview
+
+
+def check_overviews(factors, method):
+
+    if (method not in ("mean", "stride") or not factors or
+        any(not isinstance(f, int) or f < 2 for f in factors)):
+        raise PE_Write_Unknownoverview("%s, %s" % (str(factors), str(method)))
+
+    return {"factors": sorted(set(factors)), "method": method}
+
+
+def overview_name(name, factor):
+
+    return "%s%d_%s" % (OVERVIEW_PREFIX, factor, name)
+
+
+def is_overview(name):
+
+    return name.startswith(OVERVIEW_PREFIX)
+
+
+def _ceil(a, b):
+
+    return -(-a // b)
+
+
+def downsample(ndarr, start, factor, method):
+    """return (start, array) of an overview tile or None if it is empty"""
+
+    new_start = []
+
+    for axis, (st, ln) in enumerate(zip(start, ndarr.shape)):
+        b0, b1 = _ceil(st, factor), _ceil(st + ln, factor)
+
+        if b1 <= b0:
+            return None
+
+        first = [b * factor - st for b in range(b0, b1)]
+        new_start.append(b0)
+
+        if method == "stride":
+            ndarr = np.take(ndarr, first, axis=axis)
+            continue
+
+        # block means; the last block may be cut at the tile end
+        counts = np.diff(first + [ln])
+        shape = [1] * ndarr.ndim
+        shape[axis] = len(counts)
+        ndarr = (np.add.reduceat(ndarr, first, axis=axis) /
+                 counts.reshape(shape))
+
+    return tuple(new_start), ndarr
+
+
+def build_overviews(work_path, name, var_cfg, shape):
+    """write overview slabs of a variable and return their var configs"""
+
+    options = var_cfg["overviews"]
+    configs = {}
+
+    for factor in options["factors"]:
+        ovname = overview_name(name, factor)
+        manifest = {}
+
+        for relpath, write in var_cfg["manifest"].items():
+            if (not relpath.endswith(".npy") or not write["shape"] or
+                "levels" in write):
+                continue
+
+            slab = np.load(os.path.join(work_path, name, *relpath.split("/")))
+
+            if slab.dtype.kind not in "biuf":
+                continue
+
+            if options["method"] == "mean" and slab.dtype.kind != "f":
+                slab = slab.astype(np.float64)
+
+            tile = downsample(slab, write["start"], factor, options["method"])
+
+            if tile is None:
+                continue
+
+            start, ovslab = tile
+            rel_path = ["%d_%d" % (st, sh) for st, sh in
+                        zip(start, ovslab.shape)]
+            slab_name = os.path.basename(relpath)
+            slab_folder = os.path.join(work_path, ovname, *rel_path)
+
+            if not os.path.isdir(slab_folder):
+                os.makedirs(slab_folder)
+
+            ovwrite = {
+                "start": start,
+                "shape": ovslab.shape,
+                "level": write["level"],
+                "dtype": npif.dtype(ovslab),
+                "range": npif.value_range(ovslab)
+            }
+
+            ovwrite.update(npif.dump(os.path.join(slab_folder, slab_name),
+                                     ovslab))
+            manifest["/".join(rel_path + [slab_name])] = ovwrite
+
+        if manifest:
+            configs[ovname] = {
+                "shape": [shape[0]] + [_ceil(l, factor) for l in shape[1:]],
+                "attrs": {},
+                "stack": {},
+                "manifest": manifest,
+                "overview": {"of": name, "factor": factor,
+                             "method": options["method"]}
+            }
+
+    options["vars"] = dict((str(c["overview"]["factor"]), n) for n, c in
+                           configs.items())
+
+    return configs
+
+
+def overview_sels(sels, factor):
+    """map a selection of a variable to the selection of its overview"""
+
+    mapped = [sels[0]]
+
+    for sel in sels[1:]:
+        if isinstance(sel, int):
+            mapped.append(sel // factor)
+
+        elif len(sel) == 0:
+            mapped.append(range(0))
+
+        elif sel.step > 0:
+            mapped.append(range(sel[0] // factor, sel[-1] // factor + 1,
+                                max(1, sel.step // factor)))
+
+        else:
+            mapped.append(range(sel[0] // factor, sel[-1] // factor - 1,
+                                -max(1, -sel.step // factor)))
+
+    return mapped
@@ -0,0 +1,159 @@
+"""Pyslabs pencil module
+
+Pencils are a transposed copy of a variable that is built from its slabs
+at close and stored as a hidden variable. A pencil slab keeps a small
+spatial block over many stack levels so that a point over the stack is
+read from a few slabs. Values of tiles that were not written are NaN in
+the pencils, or zero if the dtype has no NaN.
+"""
+
+import os
+import numpy as np
+
+from pyslabs.const import PENCIL_PREFIX, PENCIL_TILE, PENCIL_BUFSIZE
+from pyslabs.util import tiling, slab_levels
+from pyslabs.write import VariableWriterV1
+from pyslabs.error import PE_Write_Unknownpencil
+
+
+def check_pencils(tiles, levels, layout=None):
+
+    if tiles is True:
+        tiles = PENCIL_TILE
+
+    if isinstance(tiles, int):
+        tiles = [tiles]
+
+    if (not tiles or any(not isinstance(t, int) or t < 1 for t in tiles) or
+        (levels is not None and (not isinstance(levels, int) or levels < 1))):
+        raise PE_Write_Unknownpencil("%s, %s" % (str(tiles), str(levels)))
+
+    # pencils are built from npy slabs only
+    if layout == "columnar":
+        raise PE_Write_Unknownpencil("pencils of a columnar layout")
+
+    return {"tiles": list(tiles), "levels": levels}
+
+
+def pencil_name(name):
+
+    return "%s_%s" % (PENCIL_PREFIX, name)
+
+
+def is_pencil(name):
+
+    return name.startswith(PENCIL_PREFIX)
+
+
+def _blank(shape, dtype):
+
+    if dtype.kind in "fc":
+        return np.full(shape, np.nan, dtype=dtype)
+
+    return np.zeros(shape, dtype=dtype)
+
+
+def _fill(buf, work_path, name, writes, level, region):
+    """copy the slabs of the levels and (start, length) region of buf"""
+
+    for relpath, write, (first, count) in writes:
+        lo = max(first, level)
+        hi = min(first + count, level + len(buf))
+        overlap = [(max(st, rs), min(st + ln, rs + rl)) for st, ln, (rs, rl)
+                   in zip(write["start"], write["shape"], region)]
+
+        if lo >= hi or any(a >= b for a, b in overlap):
+            continue
+
+        slab = np.load(os.path.join(work_path, name, *relpath.split("/")),
+                       mmap_mode="r")
+        src = tuple(slice(a - st, b - st) for (a, b), st in
+                    zip(overlap, write["start"]))
+        dst = tuple(slice(a - rs, b - rs) for (a, b), (rs, _) in
+                    zip(overlap, region))
+
+        if "levels" in write:
+            rows = slab[(slice(lo - first, hi - first),) + src]
+
+        else:
+            rows = slab[src][np.newaxis]
+
+        buf[(slice(lo - level, hi - level),) + dst] = rows
+
+
+def build_pencils(work_path, name, var_cfg, shape):
+    """write pencil slabs of a variable and return their var configs
+
+    Stack levels are copied in groups that fit in the build buffer, so a
+    pencil slab holds as many levels as the buffer or options allow. A
+    group over the buffer size is copied one pencil slab at a time.
+    """
+
+    options = var_cfg["pencils"]
+    writes = []
+
+    for relpath, write in var_cfg["manifest"].items():
+        if not relpath.endswith(".npy"):
+            raise PE_Write_Unknownpencil("%s: %s" % (name, relpath))
+
+        writes.append((relpath, write, slab_levels(relpath.split("/")[-1])))
+
+    if not writes:
+        return {}
+
+    dtype = np.lib.format.descr_to_dtype(writes[0][1]["dtype"])
+    levels = sorted(set(l for _, _, (first, count) in writes
+                        for l in range(first, first + count)))
+
+    # a pencil slab keeps consecutive levels
+    if levels[-1] - levels[0] + 1 != len(levels):
+        raise PE_Write_Unknownpencil("%s: levels are not consecutive" % name)
+
+    spatial = tuple(shape[1:])
+    level_bytes = max(1, int(np.prod(spatial)) * dtype.itemsize)
+    nlevels = options["levels"]
+
+    if nlevels is None:
+        nlevels = max(1, min(len(levels), PENCIL_BUFSIZE // level_bytes))
+
+    # tiles, if shorter than the dimensions, repeat their last length
+    tiles = (options["tiles"] + options["tiles"][-1:] * len(spatial))[
+             :len(spatial)]
+    blocks = tiling(spatial, tiles)
+    pcname = pencil_name(name)
+    config = {"check": {"shape": None}, "stack": {"auto": False},
+              "writes": {}, "ranges": var_cfg.get("ranges", False)}
+    writer = VariableWriterV1(os.path.join(work_path, pcname), config)
+
+    for group in range(levels[0], levels[-1] + 1, nlevels):
+        count = min(nlevels, levels[-1] + 1 - group)
+
+        if count * level_bytes > PENCIL_BUFSIZE:
+            for start, block in blocks:
+                buf = _blank((count,) + tuple(block), dtype)
+                _fill(buf, work_path, name, writes, group,
+                      list(zip(start, block)))
+                writer.write_levels(buf, start, group)
+
+            continue
+
+        # every slab is read once for all blocks of the group
+        buf = _blank((count,) + spatial, dtype)
+        _fill(buf, work_path, name, writes, group, [(0, l) for l in spatial])
+
+        for start, block in blocks:
+            key = tuple(slice(st, st + ln) for st, ln in zip(start, block))
+            writer.write_levels(buf[(slice(None),) + key], start, group)
+
+    options["var"] = pcname
+    options["levels"] = nlevels
+
+    return {
+        pcname: {
+            "shape": var_cfg["shape"],
+            "attrs": {},
+            "stack": {},
+            "manifest": config["writes"],
+            "pencil": {"of": name}
+        }
+    }
@@ -3,14 +3,650 @@
 
 """
 
+import io, threading
+import numpy as np
+
+from bisect import bisect_right
+
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 from pyslabs import slabif
-from pyslabs.error import PE_Read_Exeedlength
+from pyslabs import slabif_numpy as npif
+from pyslabs import slabif_builtins as bif
+from pyslabs.coord import coord_key
+from pyslabs.util import slab_levels
+from pyslabs.const import NPY_HEADER_SIZE, NPC_MAGIC, REDUCE_OPS
+from pyslabs.error import (PE_Read_Exeedlength, PE_Read_Invalidkey,
+                           PE_Read_Outshape, PE_Read_Unknownfield,
+                           PE_Reduce_Unknownop, PE_Reduce_Invalidaxis,
+                           PE_Read_Invalidpredicate, PE_Sel_Unknowndim,
+                           PE_Read_Missingslab)
+
+
+def _index(k, length):
+
+    idx = int(k) + length if k < 0 else int(k)
+
+    if idx < 0 or idx >= length:
+        raise PE_Read_Exeedlength("%d >= %d" % (k, length))
+
+    return idx
+
+
+def _plan_key(key, shape):
+    """convert a NumPy-style key to a fetch selection and an in-memory key
+
+    The fetch selection has an int, a range or a sorted unique index array
+    per dimension. The in-memory key, if not None, is applied to the
+    fetched block to reproduce NumPy semantics of newaxis and of integer
+    and boolean array indices.
+    """
+
+    if not isinstance(key, tuple):
+        key = (key,)
+
+    def _ndim(k):
+        if k is None or k is Ellipsis:
+            return 0
+
+        if isinstance(k, (list, np.ndarray)) and np.asarray(k).dtype == bool:
+            return np.asarray(k).ndim
+
+        return 1
+
+    nkeys = sum(_ndim(k) for k in key)
+    nellipsis = sum(1 for k in key if k is Ellipsis)
+
+    if nkeys > len(shape) or nellipsis > 1:
+        raise PE_Read_Invalidkey("too many indices: %s" % str(key))
+
+    if nellipsis == 0:
+        key = key + (Ellipsis,)
+
+    expanded = []
+
+    for k in key:
+        if k is Ellipsis:
+            expanded.extend([slice(None)] * (len(shape) - nkeys))
+
+        else:
+            expanded.append(k)
+
+    sels = []
+    residual = []
+    advanced = False
+    dim = 0
+
+    for k in expanded:
+        if k is None:
+            residual.append(None)
+            continue
+
+        if isinstance(k, slice):
+            sels.append(range(*k.indices(shape[dim])))
+            residual.append(slice(None))
+            dim += 1
+            continue
+
+        if isinstance(k, range):
+            sels.append(k)
+            residual.append(slice(None))
+            dim += 1
+            continue
+
+        if isinstance(k, (int, np.integer)) and not isinstance(k, bool):
+            sels.append(_index(k, shape[dim]))
+            residual.append(0)
+            dim += 1
+            continue
+
+        arr = np.asarray(k)
+
+        if arr.dtype == bool:
+            if arr.shape != tuple(shape[dim:dim+arr.ndim]):
+                raise PE_Read_Invalidkey("boolean index shape mismatch: %s"
+                                         % str(arr.shape))
+            arrays = np.nonzero(arr)
+
+        elif arr.dtype.kind in "iu":
+            arrays = [arr]
+
+        else:
+            raise PE_Read_Invalidkey(str(k))
+
+        # fetch unique indices once and gather them in memory
+        for arr in arrays:
+            arr = np.where(arr < 0, arr + shape[dim], arr)
+
+            if arr.size > 0 and (arr.min() < 0 or arr.max() >= shape[dim]):
+                raise PE_Read_Exeedlength("index out of %d" % shape[dim])
+
+            unique = np.unique(arr)
+            sels.append(unique)
+            residual.append(np.searchsorted(unique, arr))
+            advanced = True
+            dim += 1
+
+    if advanced:
+        # ints become one-element ranges to keep NumPy's advanced indexing
+        for i, sel in enumerate(sels):
+            if isinstance(sel, int):
+                sels[i] = range(sel, sel+1)
+
+        return sels, tuple(residual)
+
+    residual = [r for r in residual if not isinstance(r, int)]
+
+    if None not in residual:
+        return sels, None
+
+    return sels, tuple(residual)
+
+
+def normalize_key(key, shape):
+    """convert a basic key to a list of an int or a range per dimension"""
+
+    sels, residual = _plan_key(key, shape)
+
+    if residual is not None:
+        raise PE_Read_Invalidkey("only int, slice and Ellipsis are "
+                                 "supported: %s" % str(key))
+
+    return sels
+
+
+def _to_slice(sel):
+
+    return slice(sel.start, sel.stop if sel.stop >= 0 else None, sel.step)
+
+
+def _bounds(sel):
+    """return the smallest and largest indices of a selection"""
+
+    if isinstance(sel, int):
+        return sel, sel
+
+    if isinstance(sel, range) and sel.step < 0:
+        return sel[-1], sel[0]
+
+    return sel[0], sel[-1]
+
+
+def _intersect(sel, start, length):
+    """return (source key, destination key) of sel within a tile"""
+
+    if isinstance(sel, int):
+        if start <= sel < start + length:
+            return sel - start, None
+
+        return None
+
+    if isinstance(sel, np.ndarray):
+        i0 = int(np.searchsorted(sel, start))
+        i1 = int(np.searchsorted(sel, start + length))
+
+        if i0 >= i1:
+            return None
+
+        return sel[i0:i1] - start, slice(i0, i1)
+
+    if sel.step > 0:
+        i0 = max(0, -((sel.start - start) // sel.step))
+        i1 = min(len(sel), -((sel.start - start - length) // sel.step))
+
+    else:
+        i0 = max(0, -((start + length - 1 - sel.start) // -sel.step))
+        i1 = min(len(sel), (sel.start - start) // -sel.step + 1)
+
+    if i0 >= i1:
+        return None
+
+    return (range(sel[i0] - start, sel[i1-1] - start + sel.step, sel.step),
+            slice(i0, i1))
+
+
+def _member(item):
+    """return the slab of a leaf item of a tile index"""
+
+    return item[0] if isinstance(item, tuple) else item
+
+
+def _stack_rows(rows):
+    """return (source key, destination key) of (position, index) pairs"""
+
+    pos = [r[0] for r in rows]
+    idx = [r[1] for r in rows]
+    step = pos[1] - pos[0] if len(pos) > 1 else 1
+
+    if step != 0 and pos == list(range(pos[0], pos[-1] + step, step)):
+        src = range(pos[0], pos[-1] + step, step)
+
+    else:
+        src = np.asarray(pos)
+
+    return src, slice(idx[0], idx[-1] + 1)
+
+
+def _gather(array, src):
+    """index array with an int, a range or an index array per dimension"""
+
+    array = array[tuple(slice(None) if isinstance(s, np.ndarray) else
+                  (_to_slice(s) if isinstance(s, range) else s) for s in src)]
+    axis = 0
+
+    for s in src:
+        if isinstance(s, np.ndarray):
+            array = np.take(array, s, axis=axis)
+
+        if not isinstance(s, int):
+            axis += 1
+
+    return array
+
+
+def _compose(sels, key):
+    """apply key to the dimensions of sels that are not indexed out"""
+
+    view = [s for s in sels if isinstance(s, range)]
+    subs = iter(normalize_key(key, tuple(len(v) for v in view)))
+    composed = []
+
+    for sel in sels:
+        if isinstance(sel, int):
+            composed.append(sel)
+            continue
+
+        sub = next(subs)
+
+        if isinstance(sub, int):
+            composed.append(sel[sub])
+
+        else:
+            composed.append(range(sel.start + sel.step * sub.start,
+                                  sel.start + sel.step * sub.stop,
+                                  sel.step * sub.step))
+
+    return composed
+
+
+def to_key(sels):
+
+    key = []
+
+    for sel in sels:
+        key.append(sel if isinstance(sel, int) else _to_slice(sel))
+
+    return tuple(key)
+
+
+def _bounded_map(executor, func, items, window):
+    """yield results of func(*item) in completion order, window at a time"""
+
+    pending = set()
+    items = iter(items)
+
+    for item in items:
+        pending.add(executor.submit(func, *item))
+
+        if len(pending) >= window:
+            done = next(as_completed(pending))
+            pending.remove(done)
+            yield done.result()
+
+    for future in as_completed(pending):
+        yield future.result()
+
+
+def _reduce_array(op, array, axes):
+
+    if op == "count":
+        count = 1
+
+        for ax in axes:
+            count *= array.shape[ax]
+
+        return np.full(tuple(l for d, l in enumerate(array.shape) if d not in
+                             axes), count, dtype=np.int64)
+
+    return getattr(np, op)(array, axis=axes)
+
+
+def _reduce_partial(op, block, axes):
+
+    count = 1
+
+    for ax in axes:
+        count *= block.shape[ax]
+
+    if op == "count":
+        return count
+
+    if op in ("mean", "var"):
+        mean = np.mean(block, axis=axes, keepdims=True, dtype=np.float64)
+        m2 = (np.sum((block - mean) ** 2, axis=axes, keepdims=True)
+              if op == "var" else None)
+
+        return count, mean, m2
+
+    return getattr(np, op)(block, axis=axes, keepdims=True)
+
+
+def _reduce_init(op, part, shape):
+
+    if op == "count":
+        return np.zeros(shape, dtype=np.int64)
+
+    if op in ("mean", "var"):
+        return [np.zeros(shape, dtype=np.int64),
+                np.zeros(shape, dtype=np.float64),
+                np.zeros(shape, dtype=np.float64)]
+
+    if op == "sum":
+        return np.zeros(shape, dtype=part.dtype)
+
+    if part.dtype.kind == "f":
+        fill = np.inf if op == "min" else -np.inf
+
+    elif part.dtype.kind in "iu":
+        info = np.iinfo(part.dtype)
+        fill = info.max if op == "min" else info.min
+
+    else:
+        fill = op == "min"
+
+    return np.full(shape, fill, dtype=part.dtype)
+
+
+def _reduce_combine(op, acc, target, part):
+
+    if op in ("sum", "count"):
+        acc[target] += part
+
+    elif op == "min":
+        acc[target] = np.minimum(acc[target], part)
+
+    elif op == "max":
+        acc[target] = np.maximum(acc[target], part)
+
+    else:
+        # pairwise update of count, mean and M2 (Chan et al.)
+        count, mean, m2 = part
+        na = acc[0][target]
+        total = na + count
+        delta = mean - acc[1][target]
+        acc[1][target] += delta * count / total
+
+        if op == "var":
+            acc[2][target] += m2 + delta ** 2 * na * count / total
+
+        acc[0][target] = total
+
+
+def _reduce_final(op, acc):
+
+    if op == "mean":
+        return acc[1]
+
+    if op == "var":
+        return acc[2] / acc[0]
+
+    return acc
+
+
+def _combine_stats(writes):
+    """combine per-slab statistics of manifest entries"""
+
+    combined = {"min": None, "max": None, "sum": 0, "count": 0, "nans": 0}
+
+    for write in writes:
+        st = write.get("stats", None)
+
+        if st is None:
+            return None
+
+        if st["min"] is not None:
+            combined["min"] = (st["min"] if combined["min"] is None else
+                               min(combined["min"], st["min"]))
+            combined["max"] = (st["max"] if combined["max"] is None else
+                               max(combined["max"], st["max"]))
+
+        combined["sum"] += st["sum"]
+        combined["count"] += st["count"]
+        combined["nans"] += st["nans"]
+
+    values = combined["count"] - combined["nans"]
+    combined["mean"] = float(combined["sum"]) / values if values else None
+
+    return combined
+
+
+_predicate_ops = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+    "!=": np.not_equal
+}
+
+
+def _check_predicate(predicate):
+
+    if (not isinstance(predicate, (tuple, list)) or len(predicate) != 2 or
+        predicate[0] not in _predicate_ops):
+        raise PE_Read_Invalidpredicate(str(predicate))
+
+    return predicate[0], predicate[1]
+
+
+def _match_range(op, value, value_range):
+    """return "none", "all" or "some" for elements of a slab value range"""
+
+    if value_range is None:
+        return "some"
+
+    lo, hi, hasnan = value_range
+
+    if lo is None:
+        return "all" if op == "!=" else "none"
+
+    if op == ">":
+        can, always = hi > value, lo > value
+
+    elif op == ">=":
+        can, always = hi >= value, lo >= value
+
+    elif op == "<":
+        can, always = lo < value, hi < value
+
+    elif op == "<=":
+        can, always = lo <= value, hi <= value
+
+    elif op == "==":
+        can, always = lo <= value <= hi, lo == hi == value
+
+    else:
+        can, always = True, value < lo or value > hi
+
+    if not can:
+        return "none"
+
+    # NaN satisfies "!=" only
+    if always and (not hasnan or op == "!="):
+        return "all"
+
+    return "some"
+
+
+class TileIndex():
+    """sorted tile start and end indices per dimension of a slab tower
+
+    A node keeps the starts and ends of its tiles along one dimension and
+    the child nodes of the next dimension. A leaf keeps {level: slab}, or
+    {level: (slab, position)} for slabs of several stack levels.
+    """
+
+    def __init__(self, slab_tower):
+
+        self.root = self._build(slab_tower)
+        self.levels = sorted(set(l for _, _, levels in self.tiles()
+                                 for l in levels))
+
+    def _build(self, tower):
+
+        tiles = []
+        levels = {}
+
+        for name, item in tower.items():
+            if isinstance(item, dict):
+                st, ln = name.split("_")
+                tiles.append((int(st), int(st) + int(ln), self._build(item)))
+
+            else:
+                first, count = slab_levels(name)
+
+                if "_" not in name.split(".")[0]:
+                    levels[first] = item
+
+                else:
+                    for pos in range(count):
+                        levels[first + pos] = (item, pos)
+
+        if not tiles:
+            return levels
+
+        tiles.sort(key=lambda x: x[0])
+
+        return ([t[0] for t in tiles], [t[1] for t in tiles],
+                [t[2] for t in tiles])
+
+    def tiles(self, node=None, start=(), shape=()):
+        """yield (start, shape, {level: slab}) of all tiles"""
+
+        if node is None:
+            node = self.root
+
+        if isinstance(node, dict):
+            if node:
+                yield start, shape, node
+            return
+
+        for st, end, child in zip(*node):
+            for tile in self.tiles(child, start+(st,), shape+(end-st,)):
+                yield tile
+
+    def query(self, sels, node=None, start=(), shape=()):
+        """yield (start, shape, {level: slab}) of tiles intersecting sels"""
+
+        if node is None:
+            node = self.root
+
+        if isinstance(node, dict):
+            if node:
+                yield start, shape, node
+            return
+
+        starts, ends, children = node
+        sel = sels[0]
+
+        if not isinstance(sel, int) and len(sel) == 0:
+            return
+
+        lo, hi = _bounds(sel)
+
+        # tiles do not overlap, so ends are sorted as starts are
+        idx = bisect_right(ends, lo)
+
+        while idx < len(starts) and starts[idx] <= hi:
+            st, ln = starts[idx], ends[idx] - starts[idx]
+
+            if _intersect(sel, st, ln) is not None:
+                for tile in self.query(sels[1:], children[idx],
+                                       start+(st,), shape+(ln,)):
+                    yield tile
+
+            idx += 1
+
+
+class LazyArray():
+    """slab variable selection that is read only at compute()"""
+
+    def __init__(self, reader, sels, fields=None):
+
+        self.reader = reader
+        self.sels = sels
+        self.fields = fields
+
+    @property
+    def shape(self):
+        return tuple(len(s) for s in self.sels if isinstance(s, range))
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape, dtype=np.int64))
+
+    @property
+    def dtype(self):
+        return self.reader._field_dtype(self.reader.dtype, self.fields)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+
+        # field names project a structured variable
+        if isinstance(key, str) or (isinstance(key, list) and key and
+                                    all(isinstance(k, str) for k in key)):
+            return LazyArray(self.reader, self.sels, key)
+
+        return LazyArray(self.reader, _compose(self.sels, key), self.fields)
+
+    def __repr__(self):
+        return "LazyArray(shape=%s, dtype=%s)" % (str(self.shape),
+                                                  str(self.dtype))
+
+    def compute(self, out=None):
+        return self.reader.get_array(to_key(self.sels), out=out,
+                                     fields=self.fields)
+
+    def __array__(self, dtype=None, copy=None):
+
+        array = np.asarray(self.compute())
+
+        return array if dtype is None else array.astype(dtype)
 
 
 class VariableReaderV1():
-    def __init__(self, tar_file, slab_tower, var_cfg, dim_cfg):
+    def __init__(self, slab_pool, slab_tower, var_cfg, dim_cfg, cache=None,
+                 executor=None, readahead=0, workers=1):
+
+        self.slab_pool = slab_pool
+        self.cache = cache
+
+        # executor() returns the thread pool shared by the readers of a
+        # slab file; it is created at the first parallel fetch
+        self.executor = executor
+        self.workers = workers
+        self.index = TileIndex(slab_tower)
+        self._headers = {}
+        self._points = {}
 
-        self.tar_file = tar_file
+        # reader of the transposed pencils of this variable, if any
+        self.pencils = None
+
+        # read-ahead of stack levels on sequential access
+        self.readahead = readahead
+        self.readahead_issued = 0
+        self.readahead_hits = 0
+        self._last_stack = None
+        self._prefetched = OrderedDict()
+        self._prefetcher = None
+        self._readahead_lock = threading.Lock()
         self.slab_tower = slab_tower
         self.dim_cfg = dim_cfg
         self.var_cfg = var_cfg
@@ -25,95 +661,805 @@ class VariableReaderV1():
                 shape.append(s)
         self.shape = tuple(shape)
 
-    def _get_slice(self, dim, st, so, se):
+        # slab dtype and shape recorded at write time (not in old files)
+        self.manifest = self.var_cfg.get("manifest", {})
+        self.dtype = None
+        self.serializer = None
 
-        st = self.start[dim] if st is None else st
-        so = self.shape[dim] if so is None else so
-        se = 1 if se is None else se
-            
-        if so in self.dim_cfg:
-            so = self.dim_cfg[so]["length"]
+        for write in self.manifest.values():
+            self.serializer = write["serializer"]
 
-        return slice(st, so, se)
+            if self.serializer in ("npy", "npc"):
+                self.dtype = np.lib.format.descr_to_dtype(write["dtype"])
 
-    def __getitem__(self, key):
+            else:
+                self.dtype = write["dtype"]
+
+            break
+
+        # slabs of several stack levels start at multiples of their count
+        self.levels_per_slab = max([w.get("levels", 1) for w in
+                                    self.manifest.values()] or [1])
+
+        # array type of the slabs, "numpy" or a builtin type
+        self.slabtype = None
+
+        for start, shape, levels in self.index.tiles():
+            for item in levels.values():
+                self.slabtype = _member(item).path.split("/")[-1].split(".")[1]
+                break
+
+            break
+
+    def get_array(self, key=slice(None), out=None, fields=None):
+
+        if self.slabtype != "numpy":
+            return self._fetch_builtin(normalize_key(key, self.shape))
+
+        sels, residual = _plan_key(key, self.shape)
+
+        # a single level is read from its slabs, not from pencils of many
+        # levels, without comparing the two
+        if (self.pencils is not None and not isinstance(sels[0], int) and
+            self.pencils._cost(sels) < self._cost(sels)):
+            return self.pencils.get_array(key, out=out, fields=fields)
+
+        if residual is None:
+            out = self._fetch(sels, out, fields)
+            self._read_ahead(sels)
+            return out
+
+        # gather advanced indices from the fetched block in memory
+        array = self._fetch(sels, fields=fields)[residual]
+        self._read_ahead(sels)
+
+        if out is None:
+            return array
+
+        if out.shape != array.shape:
+            raise PE_Read_Outshape("%s != %s" % (str(out.shape),
+                                                 str(array.shape)))
+        out[...] = array
+
+        return out
+
+    def _cost(self, sels):
+        """number of slabs that a selection reads"""
+
+        ntiles = sum(1 for _ in self.index.query(sels[1:]))
+
+        if isinstance(sels[0], int):
+            return ntiles
+
+        if len(sels[0]) == 0:
+            return 0
 
-        whole = tuple([self._get_slice(dim, None, None, None)
-                      for dim in range(len(self.shape))])
+        nlevels = self.levels_per_slab
+        lo, hi = _bounds(sels[0])
 
-        is_slice = True
-        nslices = 0
+        return ntiles * min(len(sels[0]), hi // nlevels - lo // nlevels + 1)
 
-        if isinstance(key, int):
-            key = (key,) + whole[1:]
-            is_slice = False
-            nslices = len(whole) - 1
+    def _pool(self, ntasks):
+        """return the thread pool for ntasks slab reads or None"""
 
-        elif isinstance(key, slice):
-            key = (self._get_slice(0, key.start, key.stop, key.step),) + whole[1:]
-            nslices = len(whole)
+        if self.executor is None or self.workers < 2 or ntasks < 2:
+            return None
+
+        return self.executor()
+
+    def _field_dtype(self, dtype, fields):
+
+        if fields is None:
+            return dtype
+
+        names = [fields] if isinstance(fields, str) else list(fields)
+
+        for name in names:
+            if dtype.names is None or name not in dtype.names:
+                raise PE_Read_Unknownfield(str(name))
+
+        if isinstance(fields, str):
+            return dtype.fields[fields][0]
+
+        return np.dtype([(n, dtype.fields[n][0]) for n in names])
+
+    def _fetch(self, sels, out=None, fields=None):
+
+        out_shape = tuple(len(s) for s in sels if not isinstance(s, int))
+
+        if out is None:
+            dtype = self.dtype
+
+            if dtype is None:
+                # no manifest in older files
+                for start, shape, levels in self.index.tiles():
+                    dtype = self._load(_member(next(iter(
+                                levels.values())))).dtype
+                    break
+
+            out = np.empty(out_shape, dtype=self._field_dtype(dtype, fields))
+
+        elif out.shape != out_shape:
+            raise PE_Read_Outshape("%s != %s" % (str(out.shape),
+                                                 str(out_shape)))
+
+        if out.size == 0:
+            return out
+
+        plan = self._plan(sels)
+        pool = self._pool(len(plan))
+
+        if pool is None:
+            for slab, src, dst in plan:
+                out[dst] = self._read_slab(slab, src, fields)
+
+        else:
+            # fetch and decode slabs concurrently, copy as they arrive
+            futures = dict((pool.submit(self._read_slab, slab, src,
+                            fields), dst) for slab, src, dst in plan)
+
+            for future in as_completed(futures):
+                out[futures[future]] = future.result()
+
+        return out
+
+    def _fetch_builtin(self, sels):
+        """assemble builtin slabs into one preallocated nested list"""
+
+        out_shape = tuple(len(s) for s in sels if not isinstance(s, int))
+
+        # container types of the output dimensions
+        depths = [d for d, s in enumerate(sels[1:]) if not isinstance(s, int)]
+
+        if not isinstance(sels[0], int):
+            depths.insert(0, 0)
+
+        if 0 in out_shape:
+            # empty containers of the types of the slab at the first element
+            plan = [] if 0 in self.shape else self._plan((0,) * len(sels))
+            names = bif.containers(self._load(plan[0][0])) if plan else []
+
+            return bif.restore(bif.allocate(out_shape), [names[d] if d <
+                               len(names) else "list" for d in depths])
+
+        out = bif.allocate(out_shape) if out_shape else [None]
+        names = None
+
+        def _take(slab, src):
+
+            data = self._load(slab)
+
+            return bif.containers(data), bif.take(data, src)
+
+        plan = self._plan(sels)
+        pool = self._pool(len(plan))
+
+        if pool is None:
+            blocks = ((dst, _take(slab, src)) for slab, src, dst in plan)
+
+        else:
+            # load and slice slabs concurrently, place them as they arrive
+            futures = dict((pool.submit(_take, slab, src), dst) for slab,
+                           src, dst in plan)
+            blocks = ((futures[f], f.result()) for f in
+                      as_completed(futures))
+
+        for dst, (containers, block) in blocks:
+            if names is None:
+                names = containers
+
+            if dst:
+                bif.place(out, dst, block)
+
+            else:
+                out[0] = block
+
+        if not out_shape:
+            return out[0]
+
+        return bif.restore(out, [names[d] if d < len(names) else "list"
+                                 for d in depths])
+
+    def _plan(self, sels):
+        """return a list of (slab, source key, destination key)"""
+
+        plan = []
+
+        # stack positions to levels
+        stack_levels = self.index.levels
+
+        if isinstance(sels[0], int):
+            stack = [(stack_levels[sels[0]], ())]
+
+        else:
+            stack = [(stack_levels[p], (i,)) for i, p in enumerate(sels[0])]
+
+        for start, shape, levels in self.index.query(sels[1:]):
+            src = []
+            dst = []
+
+            for sel, st, ln in zip(sels[1:], start, shape):
+                sd = _intersect(sel, st, ln)
+
+                if sd is None:
+                    break
+
+                src.append(sd[0])
+
+                if sd[1] is not None:
+                    dst.append(sd[1])
+
+            else:
+                stacked = OrderedDict()
+
+                # the intersection of each slab is copied to the output once
+                for level, pos in stack:
+                    item = levels.get(level, None)
+
+                    if item is None:
+                        raise PE_Read_Missingslab("level %d of tile %s" %
+                                                  (level, str(start)))
+
+                    if not isinstance(item, tuple):
+                        plan.append((item, src, pos+tuple(dst)))
+
+                    elif pos:
+                        stacked.setdefault(item[0].path, (item[0], []))[
+                                           1].append((item[1], pos[0]))
+
+                    else:
+                        plan.append((item[0], [item[1]] + src, tuple(dst)))
+
+                # levels in one slab are read by one stack-axis key
+                for slab, rows in stacked.values():
+                    src0, dst0 = _stack_rows(rows)
+                    plan.append((slab, [src0] + src, (dst0,) + tuple(dst)))
+
+        return plan
+
+    def reduce(self, op, axis=None, key=slice(None)):
+        """reduce a selection slab by slab with memory bounded by the output
+
+        op is one of "sum", "mean", "min", "max", "var" and "count". Axes
+        are the dimensions of the selection as get_array(key) returns it.
+        """
+
+        if op not in REDUCE_OPS:
+            raise PE_Reduce_Unknownop(str(op))
+
+        sels = normalize_key(key, self.shape)
+        out_shape = tuple(len(s) for s in sels if not isinstance(s, int))
+        ndim = len(out_shape)
+
+        if axis is None:
+            axes = tuple(range(ndim))
+
+        else:
+            axes = []
+
+            for ax in (axis if isinstance(axis, (tuple, list)) else (axis,)):
+                if ax < -ndim or ax >= ndim:
+                    raise PE_Reduce_Invalidaxis("%d of %d" % (ax, ndim))
+
+                axes.append(ax + ndim if ax < 0 else ax)
+
+            axes = tuple(sorted(set(axes)))
+
+        if self.slabtype != "numpy" or 0 in out_shape:
+            array = np.asarray(self.get_array(to_key(sels)))
+            return _reduce_array(op, array, axes)
+
+        acc_shape = tuple(1 if d in axes else l for d, l in
+                          enumerate(out_shape))
+        acc = None
+        stacked = not isinstance(sels[0], int)
+
+        def _partial(slab, src, dst):
+
+            block = self._read_slab(slab, src)
+
+            # the stack position of a slab is a dimension of the selection
+            if stacked and isinstance(dst[0], int):
+                block = block[np.newaxis]
+                dst = (slice(dst[0], dst[0]+1),) + tuple(dst[1:])
+
+            target = tuple(slice(None) if d in axes else k for d, k in
+                           enumerate(dst))
+
+            return target, _reduce_partial(op, block, axes)
+
+        plan = self._plan(sels)
+
+        pool = self._pool(len(plan))
+
+        if pool is None:
+            partials = (_partial(*item) for item in plan)
+
+        else:
+            partials = _bounded_map(pool, _partial, plan, 2 * self.workers)
+
+        for target, part in partials:
+            if acc is None:
+                acc = _reduce_init(op, part, acc_shape)
+
+            _reduce_combine(op, acc, target, part)
+
+        result = _reduce_final(op, acc)
+
+        return result.reshape(tuple(l for d, l in enumerate(out_shape)
+                                    if d not in axes))
+
+    def sel(self, method=None, **coords):
+        """read by coordinate values of named dimensions
+
+        A value selects the index of that coordinate, or the nearest one
+        with method="nearest". A (low, high) tuple selects the indices of
+        the coordinates in the closed interval.
+        """
+
+        key = [slice(None)] * len(self.shape)
+
+        for name, value in coords.items():
+            if name not in self.array_shape:
+                raise PE_Sel_Unknowndim(name)
+
+            dim = self.array_shape.index(name)
+            dim_cfg = self.dim_cfg[name]
+
+            if name not in self._points and dim_cfg.get("points", None):
+                self._points[name] = np.asarray(dim_cfg["points"])
+
+            key[dim] = coord_key(dim_cfg, value, self.shape[dim], method,
+                                 self._points.get(name, None))
+
+        return self.get_array(tuple(key))
+
+    def stats(self, key=slice(None)):
+        """statistics of the slabs that intersect key from the manifest
+
+        "exact" is False if key covers some of the slabs only partly.
+        Returns None if the slabs have no statistics recorded.
+        """
+
+        writes = {}
+        exact = True
+
+        for slab, src, dst in self._plan(normalize_key(key, self.shape)):
+            write = self.manifest.get(slab.path.split("/", 1)[1], None)
+
+            if write is None:
+                return None
+
+            writes[slab.path] = write
+            shape = ([write["levels"]] if "levels" in write else []) + list(
+                     write["shape"])
+
+            for sel, length in zip(src, shape):
+                if (len(sel) if not isinstance(sel, int) else 1) != length:
+                    exact = False
+
+        combined = _combine_stats(writes.values())
+
+        if combined is not None:
+            combined["slabs"] = len(writes)
+            combined["exact"] = exact
+
+        return combined
+
+    def _scan(self, sels, predicate, levels_only=False):
+        """yield (dst, mask) of slabs that can satisfy a predicate
+
+        Slabs are skipped by the value ranges recorded at write time. The
+        mask is None if a range shows that all values satisfy it.
+        """
+
+        op, value = _check_predicate(predicate)
+        stacked = not isinstance(sels[0], int)
+        found = set()
+
+        for slab, src, dst in self._plan(sels):
+            if (levels_only and stacked and isinstance(dst[0], int) and
+                dst[0] in found):
+                continue
+
+            write = self.manifest.get(slab.path.split("/", 1)[1], {})
+            match = _match_range(op, value, write.get("range", None))
+
+            if match == "none":
+                continue
+
+            mask = None
+
+            if match == "some" or not levels_only:
+                block = np.asarray(self._read_slab(slab, src))
+                mask = _predicate_ops[op](block, value)
+
+                if levels_only and not np.any(mask):
+                    continue
+
+            if stacked and isinstance(dst[0], int):
+                found.add(dst[0])
+
+            yield dst, mask
+
+    def where(self, predicate, key=slice(None)):
+        """indices of the selection whose values satisfy (op, value)"""
+
+        sels = normalize_key(key, self.shape)
+
+        if self.slabtype != "numpy":
+            op, value = _check_predicate(predicate)
+            array = np.asarray(self.get_array(to_key(sels)))
+            return np.argwhere(_predicate_ops[op](array, value))
+
+        ndim = sum(1 for s in sels if not isinstance(s, int))
+        found = []
+
+        for dst, mask in self._scan(sels, predicate):
+            indices = np.argwhere(mask)
+
+            # stack position of the slab is the first index
+            if len(dst) > indices.shape[1]:
+                indices = np.insert(indices, 0, 0, axis=1)
+
+            found.append(indices + np.asarray([d.start if isinstance(d,
+                         slice) else d for d in dst], dtype=np.int64))
+
+        if not found:
+            return np.zeros((0, ndim), dtype=np.int64)
+
+        indices = np.concatenate(found)
+
+        return indices[np.lexsort(indices.T[::-1])]
+
+    def select_levels(self, predicate, key=slice(None)):
+        """stack indices at which a value of the selection satisfies
+        (op, value)"""
+
+        sels = normalize_key(key, self.shape)
+
+        if isinstance(sels[0], int):
+            matched = len(self.where(predicate, key)) > 0
+            return [sels[0]] if matched else []
+
+        if self.slabtype != "numpy":
+            return sorted(set(sels[0][i] for i in
+                              self.where(predicate, key)[:, 0]))
+
+        levels = set()
+
+        for dst, mask in self._scan(sels, predicate, levels_only=True):
+            if isinstance(dst[0], int):
+                levels.add(sels[0][dst[0]])
+
+            else:
+                # a slab of several stack levels
+                rows = range(dst[0].stop - dst[0].start)
+
+                if mask is not None:
+                    rows = np.nonzero(mask.reshape(len(rows), -1).any(
+                                      axis=1))[0]
+
+                levels.update(sels[0][dst[0].start + int(r)] for r in rows)
+
+        return sorted(levels)
+
+    def _map_tasks(self, key):
+        """slab-aligned (global key, global offset, destination) of key"""
+
+        sels = normalize_key(key, self.shape)
+        tasks = []
+
+        for slab, src, dst in self._plan(sels):
+            starts = [int(d.split("_")[0]) for d in
+                      slab.path.split("/")[1:-1]]
+
+            if isinstance(sels[0], int):
+                gkey = [sels[0]]
+
+            else:
+                gkey = [sels[0][dst[0]]]
+
+            # skip the stack-axis key of a slab of several levels
+            for st, sel in zip(starts, src[len(src) - len(starts):]):
+                if isinstance(sel, int):
+                    gkey.append(st + sel)
+
+                else:
+                    gkey.append(range(st + sel.start, st + sel.stop, sel.step))
+
+            # first global index in the order of the output; the highest
+            # index of the block for a negative step
+            offset = tuple(k if isinstance(k, int) else k[0] for k in gkey)
+
+            tasks.append((to_key(gkey), offset, dst))
+
+        return tasks
+
+    def iter_stack(self, key=slice(None), chunk=1, prefetch=1):
+        """yield blocks of chunk stack levels of a spatial selection"""
+
+        sels = normalize_key(key, self.shape)
+
+        if isinstance(sels[0], int):
+            yield self.get_array(to_key(sels))
+            return
+
+        keys = [to_key([sels[0][i:i+chunk]] + sels[1:])
+                for i in range(0, len(sels[0]), chunk)]
+
+        if prefetch < 1:
+            for k in keys:
+                yield self.get_array(k)
+
+            return
+
+        # read up to prefetch chunks ahead of the consumer
+        executor = ThreadPoolExecutor(max_workers=1)
+        futures = deque()
+
+        try:
+            for k in keys:
+                futures.append(executor.submit(self.get_array, k))
+
+                if len(futures) > prefetch:
+                    yield futures.popleft().result()
+
+            while futures:
+                yield futures.popleft().result()
+
+        finally:
+            for future in futures:
+                future.cancel()
+
+            executor.shutdown()
+
+    def lazy(self):
+
+        return LazyArray(self, [range(l) for l in self.shape])
+
+    def _header(self, slab):
+
+        if slab.path not in self._headers:
+            data = self.slab_pool.pread(slab, min(slab.size, NPY_HEADER_SIZE))
+
+            try:
+                header = npif.read_header(io.BytesIO(data))
+
+            except (ValueError, EOFError):
+                header = npif.read_header(self.slab_pool.extractfile(slab))
+
+            self._headers[slab.path] = header
+
+        return self._headers[slab.path]
+
+    def _read_ahead(self, sels):
+        """prefetch next stack levels of the same tiles on sequential access"""
+
+        stack = sels[0]
+
+        if isinstance(stack, int):
+            first = last = stack
+
+        elif isinstance(stack, range) and stack.step == 1 and len(stack) > 0:
+            first, last = stack[0], stack[-1]
 
         else:
-            buf = []
+            first = last = None
+
+        sequential = (first is not None and self._last_stack is not None and
+                      first == self._last_stack + 1)
+        self._last_stack = last
+
+        if not sequential:
+            # prefetches of an abandoned sequence are not waited for
+            with self._readahead_lock:
+                self._prefetched.clear()
+
+            return
+
+        if (self.readahead < 1 or self.cache is None or
+            last + 1 >= self.shape[0]):
+            return
+
+        if self._prefetcher is None:
+            self._prefetcher = ThreadPoolExecutor(max_workers=1)
 
-            for i, k in enumerate(key):
-                if isinstance(k, int):
-                    buf.append(k)
-                    if i==0:
-                        is_slice = False
+        ahead = range(last + 1, min(last + 1 + self.readahead, self.shape[0]))
+        plan = self._plan([ahead] + list(sels[1:]))
 
-                elif isinstance(k, slice):
-                    buf.append(self._get_slice(i, k.start, k.stop, k.step))
-                    nslices += 1
+        with self._readahead_lock:
+            for slab, src, dst in plan:
+                if (slab.path not in self._prefetched and
+                    not self.cache.has(self.slab_pool, slab.path)):
+                    self._prefetched[slab.path] = self._prefetcher.submit(
+                                                        self._load, slab)
+                    self.readahead_issued += 1
 
-            if len(self.shape) - len(key) > 0:
-                nslices += (len(self.shape) - len(key))
-                key = tuple(buf) + whole[len(key):len(self.shape)]
+            # keep the entries of about two windows only
+            while len(self._prefetched) > 2 * len(plan):
+                self._prefetched.popitem(last=False)
+
+    def readahead_info(self):
+
+        return {
+            "window": self.readahead,
+            "issued": self.readahead_issued,
+            "hits": self.readahead_hits,
+            "hit rate": (float(self.readahead_hits) / self.readahead_issued
+                         if self.readahead_issued else 0.0)
+        }
+
+    def _read_columns(self, slab, src, fields):
+        """read requested fields of a columnar slab only"""
+
+        if slab.path not in self._headers:
+            data = self.slab_pool.pread(slab, min(slab.size, NPY_HEADER_SIZE))
+
+            if b"\n" not in data[len(NPC_MAGIC):]:
+                data = self.slab_pool.pread(slab)
+
+            self._headers[slab.path] = npif.read_columns_header(data)
+
+        header = self._headers[slab.path]
+        shape = header[0]
+        names = [f[0] for f in header[1]] if fields is None else (
+                [fields] if isinstance(fields, str) else list(fields))
+
+        rows = None
+        key = src
+
+        if src and shape:
+            lo, hi = _bounds(src[0])
+            rows = slice(lo, hi+1)
+
+            if isinstance(src[0], int):
+                first = 0
+
+            elif isinstance(src[0], range):
+                first = range(src[0].start - lo, src[0].stop - lo,
+                              src[0].step)
 
             else:
-                key = tuple(buf)
-#
-#        shape = []
-#        for s in self.shape[1:]:
-#            if s in self.dim_cfg:
-#                shape.append(self.dim_cfg[s]["length"])
-#
-#            else:
-#                shape.append(s)
-
-        is_squeezed, array = slabif.get_array(self.tar_file, self.slab_tower, self.shape[1:],
-                                        key[1:], key[0])
-
-        ndim = slabif.ndim(array)
-        if ndim > nslices:
-            _, array = slabif.squeeze(array)
-
-        elif ndim < nslices:
-            array = slabif.expand_dim(array)
-
-        return array
-#
-#        if self.unstackable:
-#            if not is_slice and len(array) == 1 and slabif.ndim(array) == len(self.shape):
-#                print("BBBB", self.shape, key, array.shape, is_squeezed)
-#                return array[0]
-#            else:
-#                return array
-#
-#        elif is_squeezed:
-#            if is_slice:
-#                print("AAAA", self.shape, key, slabif.shape(array), is_squeezed)
-#                return slabif.exapand_dim(array)
-#            else:
-#                return array
-#        else:
-#            return array
-#        if (self.unstackable and not is_slice and len(array) == 1 and
-#            slabif.ndim(array) == len(self.shape)):
-#            print("BBBB", self.shape, key, array.shape, is_squeezed)
-#            return array[0]
-#
-#        else:
-#            print("AAAA", self.shape, key, slabif.shape(array), is_squeezed)
-#            return array
-#
+                first = src[0] - lo
+
+            key = [first] + list(src[1:])
+
+        columns = [_gather(npif.load_column(self.slab_pool, slab, header, n,
+                   rows), key) for n in names]
+
+        if isinstance(fields, str):
+            return columns[0]
+
+        block = np.empty(columns[0].shape, dtype=[(n, c.dtype) for n, c in
+                                                  zip(names, columns)])
+
+        for name, column in zip(names, columns):
+            block[name] = column
+
+        return block
+
+    def _read_slab(self, slab, src, fields=None):
+
+        with self._readahead_lock:
+            future = self._prefetched.pop(slab.path, None)
+
+        if future is not None:
+            try:
+                future.result()
+
+            except Exception:
+                pass
+
+            if self.cache.has(self.slab_pool, slab.path):
+                with self._readahead_lock:
+                    self.readahead_hits += 1
+
+        if (slab.path.endswith(".npc") and self.slab_pool.checksums is None
+            and (self.cache is None or not self.cache.has(self.slab_pool,
+                                                          slab.path))):
+            return self._read_columns(slab, src, fields)
+
+        block = self._read_rows(slab, src)
+
+        return block if fields is None else block[fields]
+
+    def _read_rows(self, slab, src):
+
+        # read the leading-axis rows only of an uncached and C-ordered slab
+        if (src and self.slab_pool.checksums is None and
+            (self.cache is None or not self.cache.has(self.slab_pool,
+                                                      slab.path))):
+
+            header = (self._header(slab) if slab.path.endswith(".npy")
+                      else None)
+
+            if (header is not None and not header[1] and
+                not header[2].hasobject):
+
+                lo, hi = _bounds(src[0])
+                rows = slice(lo, hi+1)
+
+                if isinstance(src[0], int):
+                    first = 0
+
+                elif isinstance(src[0], range):
+                    first = range(src[0].start - lo, src[0].stop - lo,
+                                  src[0].step)
+
+                else:
+                    first = src[0] - lo
+
+                if rows.stop - rows.start < header[0][0]:
+                    rowdata = npif.load_rows(self.slab_pool, slab, header, rows)
+                    return _gather(rowdata, [first] + list(src[1:]))
+
+        return _gather(self._load(slab), src)
+
+    def _load(self, slab):
+
+        atype = slab.path.split("/")[-1].split(".")[1]
+
+        return slabif.load(self.slab_pool, slab, atype, cache=self.cache)
+
+    def cache_clear(self):
+
+        if self.cache is not None:
+            self.cache.clear(self.slab_pool)
+
+    def cache_info(self):
+
+        return None if self.cache is None else self.cache.info()
+
+    def close(self):
+
+        if self._prefetcher is not None:
+            self._prefetcher.shutdown(wait=True)
+            self._prefetcher = None
+
+        self._prefetched.clear()
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def nbytes(self):
+        return sum(w["nbytes"] for w in self.manifest.values())
+
+    def info(self):
+
+        if self.manifest:
+            sizes = [w["nbytes"] for w in self.manifest.values()]
+
+        else:
+            # files of older versions have no manifest; sizes of members
+            members = dict((m.path, m.size) for m in (_member(item) for _,
+                           _, levels in self.index.tiles() for item in
+                           levels.values()))
+            sizes = list(members.values())
+
+        info = {
+            "shape": self.shape,
+            "dtype": self.dtype,
+            "serializer": self.serializer,
+            "slab count": len(sizes),
+            "total bytes": sum(sizes),
+            "max bytes": max(sizes) if sizes else 0,
+            "min bytes": min(sizes) if sizes else 0
+        }
+
+        # value range from the statistics recorded at write time
+        stats = (_combine_stats(self.manifest.values()) if self.manifest
+                 else None)
+
+        if stats is not None:
+            info["min value"] = stats["min"]
+            info["max value"] = stats["max"]
+            info["nan count"] = stats["nans"]
+
+        return info
+
+    def __getitem__(self, key):
+
+        return self.get_array(key)
@@ -0,0 +1,138 @@
+"""Pyslabs rechunk module
+
+A rechunked copy of a slab file has the same variables and dimensions
+with new tiles and a number of stack levels per slab. The copy is made
+one output slab at a time so that memory is bounded by a few slabs.
+"""
+
+import copy
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+from pyslabs.core import Dimension, StackDimension, master_open
+from pyslabs.read import _bounded_map
+from pyslabs.util import tiling
+from pyslabs.overview import is_overview
+from pyslabs.pencil import is_pencil
+from pyslabs.error import PE_Rechunk_Invalidtiles
+
+
+def _check_tiles(tiles):
+
+    if tiles is None:
+        return ()
+
+    if any(t is not None and t < 1 for t in ((tiles,) if isinstance(tiles,
+           int) else tiles)):
+        raise PE_Rechunk_Invalidtiles(str(tiles))
+
+    return tiles
+
+
+def _var_shape(var_cfg, dims):
+
+    # lengths are checked at close by the dimensions of the variable only
+    if not any(l in dims for l in var_cfg["shape"]):
+        return None
+
+    shape = []
+
+    for idx, length in enumerate(var_cfg["shape"]):
+        if length in dims:
+            dim_cls = StackDimension if idx == 0 else Dimension
+            shape.append(dim_cls(dims[length]))
+
+        else:
+            shape.append(length)
+
+    return shape
+
+
+def rechunk(src_path, dst_path, tiles=None, levels_per_slab=1, var_names=None,
+            workers=None, shard=None, pencils=None, pencil_levels=None,
+            allow_pickle=False):
+    """copy a slab file with new tiles and stack levels per slab
+
+    tiles is a slab length per non-stack dimension; None, or no length,
+    keeps a dimension in one tile. var_names limits the copy to the given
+    variables. Slabs are read by a pool of workers, at most two per
+    worker ahead of the writer. pencils adds transposed pencils of the
+    tile lengths to all variables; pencils of the source variables are
+    built again otherwise.
+    """
+
+    if levels_per_slab < 1:
+        raise PE_Rechunk_Invalidtiles("levels per slab: %d" % levels_per_slab)
+
+    tiles = _check_tiles(tiles)
+
+    src = master_open(src_path, 1, mode="r", readahead=0,
+                      allow_pickle=allow_pickle)
+
+    try:
+        names = [n for n in src.config["vars"] if not is_overview(n) and
+                 not is_pencil(n)]
+
+        if var_names is not None:
+            names = [n for n in names if n in var_names]
+
+        dst = master_open(dst_path, 1, mode="w", shard=shard)
+        dst.config["dims"].update(copy.deepcopy(src.config["dims"]))
+        dst.config["attrs"].update(copy.deepcopy(src.config["attrs"]))
+        executor = (ThreadPoolExecutor(max_workers=workers) if workers and
+                    workers > 1 else None)
+
+        try:
+            for name in names:
+                var_cfg = src.config["vars"][name]
+                reader = src.get_reader(name)
+                options = dict(("attr_" + k, v) for k, v in
+                               var_cfg["attrs"].items())
+
+                if pencils:
+                    options["pencils"] = pencils
+                    options["pencil_levels"] = pencil_levels
+
+                elif "pencils" in var_cfg:
+                    options["pencils"] = var_cfg["pencils"]["tiles"]
+
+                writer = dst.get_writer(name, _var_shape(var_cfg,
+                            dst.config["dims"]), layout=var_cfg.get("layout",
+                            None), stats=var_cfg.get("stats", False),
+                            ranges=var_cfg.get("ranges", False), **options)
+
+                # slabs of builtin types keep one level each
+                nlevels = (levels_per_slab if reader.slabtype == "numpy"
+                           else 1)
+
+                tasks = [(level, start, tuple([slice(level, min(level +
+                         nlevels, reader.shape[0]))] + [slice(st, st + ln)
+                         for st, ln in zip(start, shape)]))
+                         for level in range(0, reader.shape[0], nlevels)
+                         for start, shape in tiling(reader.shape[1:], tiles)]
+
+                def _read(level, start, key):
+                    return level, start, reader.get_array(key)
+
+                if executor is None:
+                    blocks = (_read(*task) for task in tasks)
+
+                else:
+                    blocks = _bounded_map(executor, _read, tasks, 2 * workers)
+
+                for level, start, block in blocks:
+                    if nlevels > 1:
+                        writer.write_levels(np.asarray(block), start, level)
+                        continue
+
+                    for pos, slab in enumerate(block):
+                        writer.write(slab, start, level + pos)
+
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        dst.close()
+
+    finally:
+        src.close()
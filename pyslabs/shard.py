@@ -0,0 +1,255 @@
+"""Pyslabs shard module
+
+A sharded slab file is a small manifest file that holds the configuration
+plus a set of shard files that hold the slab members. Slab members of the
+manifest are read through a bounded pool of open shard handles.
+"""
+
+import os, io, zlib, threading, tarfile
+
+from collections import OrderedDict
+from pyslabs.const import SHARD_MAXOPEN, VERIFY_BLOCKSIZE
+from pyslabs.util import slab_levels
+from pyslabs.error import (PE_Shard_Unknownpolicy, PE_Shard_Outofrange,
+                           PE_Read_Checksummismatch)
+
+
+class ShardMember():
+
+    def __init__(self, path, shard, offset_data, size):
+
+        self.path = path
+        self.name = path
+        self.shard = shard
+        self.offset_data = offset_data
+        self.size = size
+
+
+def check_policy(policy):
+
+    if policy is None or policy == "var":
+        return policy
+
+    if isinstance(policy, dict) and len(policy) == 1:
+        policy = tuple(policy.items())[0]
+
+    if (isinstance(policy, (tuple, list)) and len(policy) == 2 and
+        policy[0] in ("stack", "size") and isinstance(policy[1], int) and
+        policy[1] > 0):
+        return tuple(policy)
+
+    raise PE_Shard_Unknownpolicy(str(policy))
+
+
+def shard_path(slab_path, index):
+
+    base, ext = os.path.splitext(slab_path)
+
+    return "%s.%d%s" % (base, index, ext)
+
+
+def assign_shards(policy, members):
+    """group (arcname, size) members into a list of shards"""
+
+    shards = OrderedDict()
+
+    if policy == "var":
+        for arcname, size in members:
+            shards.setdefault(arcname.split("/")[0], []).append(arcname)
+
+    elif policy[0] == "stack":
+        for arcname, size in members:
+            level = slab_levels(os.path.basename(arcname))[0]
+            shards.setdefault(level // policy[1], []).append(arcname)
+
+        shards = OrderedDict((k, shards[k]) for k in sorted(shards.keys()))
+
+    elif policy[0] == "size":
+        total = 0
+        index = 0
+
+        for arcname, size in members:
+            if total > 0 and total + size > policy[1]:
+                index += 1
+                total = 0
+
+            shards.setdefault(index, []).append(arcname)
+            total += size
+
+    return list(shards.values())
+
+
+def write_shards(slab_path, work_path, policy, exclude=()):
+
+    members = []
+
+    for root, dirs, files in os.walk(work_path):
+        for name in files:
+            path = os.path.join(root, name)
+            arcname = os.path.relpath(path, work_path).replace(os.sep, "/")
+
+            if arcname not in exclude:
+                members.append((arcname, os.path.getsize(path)))
+
+    members.sort()
+
+    files = []
+    index = {}
+
+    for idx, arcnames in enumerate(assign_shards(policy, members)):
+        path = shard_path(slab_path, idx)
+
+        with tarfile.open(path, "w") as tar:
+            for arcname in arcnames:
+                tar.add(os.path.join(work_path, *arcname.split("/")),
+                        arcname=arcname)
+
+        with tarfile.open(path, "r:") as tar:
+            for entry in tar:
+                index[entry.path] = (idx, entry.offset_data, entry.size)
+
+        files.append(os.path.basename(path))
+
+    return {"policy": policy, "files": files, "members": index}
+
+
+class ShardPool():
+    """bounded pool of open shard file handles
+
+    A slab file without shards is a pool of one shard.
+    """
+
+    def __init__(self, paths, maxopen=SHARD_MAXOPEN):
+
+        self.paths = list(paths)
+        self.maxopen = maxopen
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+
+        # member path -> crc32 of members to verify at read
+        self.checksums = None
+
+        # total number of bytes read from shards
+        self.nbytes = 0
+
+    def _acquire(self, shard):
+
+        if shard < 0 or shard >= len(self.paths):
+            raise PE_Shard_Outofrange("%d" % shard)
+
+        with self._lock:
+            if shard in self._handles:
+                self._handles.move_to_end(shard)
+                handle = self._handles[shard]
+
+            else:
+                handle = [io.open(self.paths[shard], "rb"), 0]
+                self._handles[shard] = handle
+
+            handle[1] += 1
+            self._trim()
+
+        return handle
+
+    def _trim(self):
+
+        # close least-recently used handles that are not in use
+        for key in list(self._handles.keys()):
+            if len(self._handles) <= self.maxopen:
+                break
+
+            if self._handles[key][1] == 0:
+                self._handles.pop(key)[0].close()
+
+    def _release(self, handle):
+
+        with self._lock:
+            handle[1] -= 1
+            self._trim()
+
+    def pread(self, member, size=None, offset=0):
+
+        if size is None:
+            size = member.size - offset
+
+        handle = self._acquire(getattr(member, "shard", 0))
+
+        try:
+            fp = handle[0]
+            pos = member.offset_data + offset
+
+            if hasattr(os, "pread"):
+                data = os.pread(fp.fileno(), size, pos)
+
+            else:
+                with self._lock:
+                    fp.seek(pos)
+                    data = fp.read(size)
+
+            with self._lock:
+                self.nbytes += len(data)
+
+            return data
+
+        finally:
+            self._release(handle)
+
+    def _verify(self, member, data):
+
+        if self.checksums is not None and member.path in self.checksums:
+            if zlib.crc32(data) != self.checksums[member.path]:
+                raise PE_Read_Checksummismatch(member.path)
+
+    def extractfile(self, member):
+
+        data = self.pread(member)
+        self._verify(member, data)
+
+        return io.BytesIO(data)
+
+    def readbuffer(self, member):
+        """read a member into a new writable buffer"""
+
+        buf = bytearray(member.size)
+        handle = self._acquire(getattr(member, "shard", 0))
+
+        try:
+            fp = handle[0]
+
+            if hasattr(os, "preadv"):
+                nread = os.preadv(fp.fileno(), [buf], member.offset_data)
+
+            else:
+                with self._lock:
+                    fp.seek(member.offset_data)
+                    nread = fp.readinto(buf)
+
+            with self._lock:
+                self.nbytes += nread
+
+        finally:
+            self._release(handle)
+
+        self._verify(member, buf)
+
+        return buf
+
+    def checksum(self, member, blocksize=VERIFY_BLOCKSIZE):
+
+        crc32 = 0
+
+        for offset in range(0, member.size, blocksize):
+            crc32 = zlib.crc32(self.pread(member, min(blocksize,
+                                    member.size - offset), offset), crc32)
+
+        return crc32
+
+    def nopen(self):
+
+        return len(self._handles)
+
+    def close(self):
+
+        with self._lock:
+            while self._handles:
+                self._handles.popitem()[1][0].close()
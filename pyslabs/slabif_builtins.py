@@ -3,188 +3,404 @@
 
 """
 
-import os, io, pickle, itertools
+import os, io, json, array, pickle, struct
 
-from pyslabs.error import PE_Stabif_Typemismatch
-from pyslabs.util import ScalarList, DEBUG_LEVEL, DEBUG_INFO
+from pyslabs.const import TYPED_MAGIC, OOB_MAGIC, OOB_MINSIZE, OOB_ALIGN
+from pyslabs.util import ChecksumFile
+
+# array.array type codes of homogeneous scalar sequences
+_typecodes = {"int": "q", "float": "d", "bool": "b"}
+_containers = {"list": list, "tuple": tuple}
+_INT_MIN, _INT_MAX = -2**63, 2**63-1
 
 def length(slab, axis=0):
 
     return len(slab)
 
 
-def slice2type(_slice, _type):
+def shape(slab):
 
-    return _type(_slice)
+    s = []
 
+    # nested lists and tuples only; other items are objects of the slab
+    while isinstance(slab, (list, tuple)) and len(slab) > 0:
+        s.append(len(slab))
+        slab = slab[0]
 
-def shape(slab):
+    return tuple(s)
 
-    s = []
 
-    while slab:
-        try:
-            l = len(slab)
+def dtype(slab):
+
+    while isinstance(slab, (list, tuple)) and len(slab) > 0:
+        slab = slab[0]
+
+    return type(slab).__name__
+
+
+class TypedSequence():
+    """rectangular list or tuple of int, float or bool in an array.array
+
+    Slicing works on the flat buffer and the original containers are
+    rebuilt only for the selected elements.
+    """
+
+    def __init__(self, buf, shape, containers, pytype):
+
+        self.buf = buf
+        self.shape = tuple(shape)
+        self.containers = list(containers)
+        self.pytype = pytype
+
+        self.strides = []
+        stride = 1
+
+        for length in reversed(self.shape):
+            self.strides.insert(0, stride)
+            stride *= length
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def nbytes(self):
+        return self.buf.itemsize * len(self.buf)
+
+    def _leaves(self, base, sel):
+
+        if sel.step > 0:
+            leaves = self.buf[base+sel.start:base+sel.stop:sel.step].tolist()
+
+        else:
+            leaves = [self.buf[base+i] for i in sel]
+
+        if self.pytype == "bool":
+            leaves = [bool(v) for v in leaves]
+
+        return leaves
+
+    def _build(self, sels, depth, base, rebuild=True):
+
+        sel = sels[depth]
+        stride = self.strides[depth]
+
+        if isinstance(sel, int):
+            if depth == len(self.shape) - 1:
+                return self._leaves(base, range(sel, sel+1))[0]
+
+            return self._build(sels, depth+1, base+sel*stride, rebuild)
 
-            if l > 0:
-                s.append(l)
-                slab = slab[0]
+        if depth == len(self.shape) - 1:
+            items = self._leaves(base, sel)
+
+        else:
+            items = [self._build(sels, depth+1, base+i*stride, rebuild)
+                     for i in sel]
+
+        container = _containers[self.containers[depth]]
+
+        return items if not rebuild or container is list else container(items)
+
+    def take(self, src):
+        """nested lists of an int or a range per dimension"""
+
+        sels = list(src) + [range(l) for l in self.shape[len(src):]]
+
+        return self._build(sels, 0, 0, rebuild=False)
+
+    def get_slice(self, key):
+
+        if isinstance(key, (int, slice)):
+            key = (key,)
+
+        sels = []
+
+        for idx, length in enumerate(self.shape):
+            k = key[idx] if idx < len(key) else slice(None)
+
+            if isinstance(k, int):
+                sels.append(k + length if k < 0 else k)
 
             else:
-                break
-        except TypeError:
-            break
+                sels.append(range(*k.indices(length)))
 
-    return tuple(s)
+        return self._build(sels, 0, 0)
 
+    def rebuild(self):
+        return self.get_slice(())
 
-def dump(path, slab):
 
-    with io.open(path, "wb") as fp:
-        pickle.dump(slab, fp)
-        fp.flush()
-        os.fsync(fp.fileno())
+def containers(slab):
+    """container type names of the nested dimensions of a slab"""
 
-def load(tar_file):
+    if isinstance(slab, TypedSequence):
+        return list(slab.containers)
 
-    return pickle.load(tar_file)
+    names = []
 
+    while isinstance(slab, (list, tuple)) and len(slab) > 0:
+        names.append(type(slab).__name__)
+        slab = slab[0]
 
-def stack(stacker, lower):
+    return names
 
-    if stacker is None:
-        try:
-            return type(lower)([lower])
 
-        except TypeError:
-            return (lower,)
+def take(slab, src):
+    """nested lists of an int or a range per leading dimension of a slab"""
+
+    if isinstance(slab, TypedSequence):
+        return slab.take(src)
+
+    if not src:
+        return slab
+
+    sel = src[0]
+
+    if isinstance(sel, int):
+        return take(slab[sel], src[1:])
+
+    if len(src) == 1 and sel.step > 0:
+        return list(slab[sel.start:sel.stop:sel.step])
+
+    return [take(slab[i], src[1:]) for i in sel]
+
+
+def place(out, dst, block):
+    """copy block into a preallocated nested list at a destination key"""
+
+    sel = dst[0]
 
-    if isinstance(stacker, list):
-        stacker.append(lower)
+    if len(dst) == 1:
+        out[sel] = block
 
-    elif isinstance(stacker, tuple):
-        stacker += (lower,)
+    elif isinstance(sel, int):
+        place(out[sel], dst[1:], block)
 
     else:
-        import pdb; pdb.set_trace()        
+        for item, idx in zip(block, range(*sel.indices(len(out)))):
+            place(out[idx], dst[1:], item)
 
-    return stacker
 
+def allocate(shape):
+    """preallocated nested list"""
 
-def expand_dim(array):
+    if len(shape) == 1:
+        return [None] * shape[0]
 
-    return type(array)([array])
+    return [allocate(shape[1:]) for _ in range(shape[0])]
 
 
-def get_blank():
-    return tuple()
+def restore(nested, names):
+    """convert nested lists to the given container types in one pass"""
 
+    if not names or all(n == "list" for n in names):
+        return nested
 
-def concatenate(concater, panel, axis):
+    if len(names) > 1:
+        nested = [restore(item, names[1:]) for item in nested]
 
-    if DEBUG_LEVEL > DEBUG_INFO:
-        print("Concatenate IN (concat, panel, axis): ", concater, panel, axis)
+    return _containers.get(names[0], list)(nested)
 
-    from pyslabs import slabif
 
-    if concater is None:
-        return panel
+def _typed_layout(slab):
+    """shape, container names and scalar type of a homogeneous sequence"""
 
-    if type(concater) != type(panel) and not isinstance(concater, ScalarList):
-        raise PE_Stabif_Typemismatch("%s != %s" % (type(concater).__name__,
-                                    type(panel).__name__))
+    shape = []
+    containers = []
+    level = [slab]
 
-    if isinstance(concater, ScalarList):
-        concater.concat(panel)
+    while isinstance(level[0], (list, tuple)):
+        ctype = type(level[0])
+        length = len(level[0])
 
-    elif isinstance(concater, list):
-        if axis > 0:
-            if len(concater) != len(panel):
-                raise PE_Stabif_Lengthmismatch("%d != %d" % (len(concater),
-                                        len(panel)))
-            buf = []
-            for idx in range(len(concater)):
-                buf.append(slabif.concatenate(concater[idx], panel[idx], axis=axis-1))
-            concater = buf 
+        if (length == 0 or ctype not in (list, tuple) or
+            any(type(s) is not ctype or len(s) != length for s in level)):
+            return None
 
-        else:
-            concater.extend(panel)
-
-    elif isinstance(concater, tuple):
-        if axis > 0:
-            if len(concater) != len(panel):
-                raise PE_Stabif_Lengthmismatch("%d != %d" % (len(concater),
-                                        len(panel)))
-            buf = []
-            for idx in range(len(concater)):
-                buf.append(slabif.concatenate(concater[idx], panel[idx], axis=axis-1))
-            concater = tuple(buf) 
+        shape.append(length)
+        containers.append(ctype.__name__)
+        level = [e for s in level for e in s]
 
-        else:
-            concater += panel
+    if not shape:
+        return None
 
-    else:
-        if axis > 0:
-            raise PE_Stabif_Wrongaxis()
+    pytype = type(level[0]).__name__
 
-        concater = ScalarList((concater, panel))
+    if (pytype not in _typecodes or
+        any(type(e) is not type(level[0]) for e in level)):
+        return None
 
+    if pytype == "int" and (min(level) < _INT_MIN or max(level) > _INT_MAX):
+        return None
 
-    if DEBUG_LEVEL > DEBUG_INFO:
-        print("Concatenate OUT: ", concater)
-    return concater
+    return shape, containers, pytype, level
 
 
+def _pickle_oob(slab):
+    """pickle with large contiguous buffers kept out of the pickle stream"""
 
-def squeeze(array):
-    if DEBUG_LEVEL > DEBUG_INFO:
-        print("Squeeze IN: ", array)
+    buffers = []
 
-    is_squeezed = False
+    def _callback(pbuf):
 
-    if isinstance(array, (list, tuple, ScalarList)):
-        if len(array) == 1:
-            array = array[0]
-            is_squeezed = True
+        try:
+            raw = pbuf.raw()
 
-    else:
-        import pdb; pdb.set_trace()        
+        except BufferError:
+            return True
 
-    if DEBUG_LEVEL > DEBUG_INFO:
-        print("Squeeze OUT(array, is_squeezed): ", array, is_squeezed)
+        if raw.nbytes < OOB_MINSIZE:
+            return True
 
-    return is_squeezed, array
+        buffers.append(raw)
 
+    data = pickle.dumps(slab, protocol=5, buffer_callback=_callback)
 
-def get_slice(slab, key):
+    return data, buffers
 
-    from pyslabs import slabif
 
-    if not key:
-        return slab
+def _aligned(offset):
 
-    if isinstance(key, (int, slice)):
-        key = (key,)
+    return -(-offset // OOB_ALIGN) * OOB_ALIGN
 
-    if isinstance(key[0], int):
-        is_slice = False
-        start, stop, step = key[0], key[0]+1, 1
 
-    elif isinstance(key[0], slice):
-        is_slice = True
-        start, stop, step = key[0].start, key[0].stop, key[0].step
+def _write_header(cfp, magic, header, align=False):
+    """write magic, a 4-byte header length and a JSON header"""
 
-    buf = []
+    header = json.dumps(header)
 
-    for item in itertools.islice(slab, start, stop, step):
-        if len(key) > 1:
-            item_slice = slabif.get_slice(item, key[1:])
-            buf.append(item_slice)
-        else:
-            buf.append(item)
+    if align:
+        # header is padded so that the payload starts aligned
+        prefix = len(magic) + 4 + len(header)
+        header += " " * (_aligned(prefix) - prefix)
+
+    header = header.encode("utf-8")
+    cfp.write(magic)
+    cfp.write(struct.pack("<I", len(header)))
+    cfp.write(header)
+
+
+def _read_header(data, magic):
+    """return (JSON header, payload start) of a length-prefixed header"""
+
+    pos = len(magic) + 4
+    size = struct.unpack("<I", bytes(data[len(magic):pos]))[0]
+
+    return json.loads(bytes(data[pos:pos+size]).decode("utf-8")), pos + size
+
+
+def stats(slab):
+    """min, max, sum, count and NaN count of a homogeneous sequence"""
+
+    layout = _typed_layout(slab)
+
+    if layout is None:
+        return None
+
+    leaves = layout[3]
+    values = [v for v in leaves if v == v]
+    nans = len(leaves) - len(values)
+
+    if not values:
+        return {"min": None, "max": None, "sum": 0, "count": len(leaves),
+                "nans": nans}
+
+    return {"min": min(values), "max": max(values), "sum": sum(values),
+            "count": len(leaves), "nans": nans}
+
+
+def value_range(slab):
+    """[min, max, has NaN] of a homogeneous sequence"""
+
+    st = stats(slab)
+
+    if st is None:
+        return None
+
+    return [st["min"], st["max"], st["nans"] > 0]
+
+
+def dump(path, slab):
+
+    layout = _typed_layout(slab)
 
-    if not is_slice:
-        return buf[0]
+    if layout is None and pickle.HIGHEST_PROTOCOL >= 5:
+        data, buffers = _pickle_oob(slab)
 
     else:
-        return slice2type(buf, type(slab))
+        data, buffers = None, []
+
+    with io.open(path, "wb") as fp:
+        cfp = ChecksumFile(fp)
+
+        if layout is None and not buffers:
+            serializer = "pickle"
+
+            if data is None:
+                pickle.dump(slab, cfp)
+
+            else:
+                cfp.write(data)
+
+        elif layout is None:
+            serializer = "pickle5"
+
+            # offsets are relative to the end of the aligned header
+            offsets = []
+            offset = len(data)
+
+            for buf in buffers:
+                offset = _aligned(offset)
+                offsets.append([offset, buf.nbytes])
+                offset += buf.nbytes
+
+            _write_header(cfp, OOB_MAGIC, {"pickle": len(data),
+                          "buffers": offsets}, align=True)
+            cfp.write(data)
+            offset = len(data)
+
+            for (start, length), buf in zip(offsets, buffers):
+                cfp.write(b"\0" * (start - offset))
+                cfp.write(buf)
+                offset = start + length
+
+        else:
+            serializer = "array"
+            shape, containers, pytype, leaves = layout
+            header = {"shape": shape, "containers": containers,
+                      "type": pytype, "typecode": _typecodes[pytype]}
+            _write_header(cfp, TYPED_MAGIC, header)
+            cfp.write(array.array(_typecodes[pytype], leaves).tobytes())
+
+        fp.flush()
+        os.fsync(fp.fileno())
+
+    return {"serializer": serializer, "nbytes": cfp.nbytes, "crc32": cfp.crc32}
+
+
+def load(data):
+    """load a slab from a bytes-like object
+
+    Objects are new at every load and data is not modified. Out-of-band
+    pickle buffers are views of a private writable copy of data.
+    """
+
+    data = memoryview(data)
+
+    if bytes(data[:len(OOB_MAGIC)]) == OOB_MAGIC:
+        header, pos = _read_header(data, OOB_MAGIC)
+        payload = memoryview(bytearray(data[pos:]))
+
+        return pickle.loads(payload[:header["pickle"]], buffers=[
+                            payload[s:s+l] for s, l in header["buffers"]])
+
+    if bytes(data[:len(TYPED_MAGIC)]) != TYPED_MAGIC:
+        return pickle.loads(data)
+
+    header, pos = _read_header(data, TYPED_MAGIC)
+
+    buf = array.array(header["typecode"])
+    buf.frombytes(data[pos:])
+
+    return TypedSequence(buf, header["shape"], header["containers"],
+                         header["type"])
@@ -3,9 +3,11 @@
 
 """
 
+import json
 import numpy as np
 from io import BytesIO
-from pyslabs.util import DEBUG_LEVEL, DEBUG_INFO
+from pyslabs.const import NPC_MAGIC, NPC_ALIGN
+from pyslabs.util import ChecksumFile
 
 
 def length(slab, axis=0):
@@ -16,59 +18,189 @@ def shape(ndarr):
     return ndarr.shape
 
 
-def dump(path, ndarr):
-    return np.save(path, ndarr)
+def dtype(ndarr):
+    return np.lib.format.dtype_to_descr(ndarr.dtype)
+
+
+def _aligned(offset):
+
+    return -(-offset // NPC_ALIGN) * NPC_ALIGN
+
+
+def stats(ndarr):
+    """min, max, sum, count and NaN count of a numeric array"""
+
+    if ndarr.dtype.kind not in "biuf":
+        return None
+
+    count = int(ndarr.size)
+    nans = 0
+
+    if ndarr.dtype.kind == "f":
+        nans = int(np.count_nonzero(np.isnan(ndarr)))
+
+    if count == nans:
+        return {"min": None, "max": None, "sum": 0, "count": count,
+                "nans": nans}
+
+    if nans > 0:
+        vmin, vmax = np.nanmin(ndarr), np.nanmax(ndarr)
+        vsum = np.nansum(ndarr)
+
+    else:
+        vmin, vmax, vsum = ndarr.min(), ndarr.max(), ndarr.sum()
+
+    return {"min": vmin.item(), "max": vmax.item(), "sum": vsum.item(),
+            "count": count, "nans": nans}
+
+
+def value_range(ndarr):
+    """[min, max, has NaN] of a numeric array"""
+
+    if ndarr.dtype.kind not in "biuf" or ndarr.size == 0:
+        return None
+
+    if ndarr.dtype.kind == "f":
+        vmin, vmax = np.min(ndarr), np.max(ndarr)
+
+        # min and max are NaN if the array has a NaN
+        if np.isnan(vmin):
+            if np.all(np.isnan(ndarr)):
+                return [None, None, True]
+
+            return [np.nanmin(ndarr).item(), np.nanmax(ndarr).item(), True]
+
+        return [vmin.item(), vmax.item(), False]
+
+    return [ndarr.min().item(), ndarr.max().item(), False]
+
+
+def dump(path, ndarr, layout=None):
+
+    if layout == "columnar" and ndarr.dtype.names:
+        return dump_columns(path, ndarr)
+
+    with open(path, "wb") as fp:
+        cfp = ChecksumFile(fp)
+        np.save(cfp, ndarr)
+
+    return {"serializer": "npy", "nbytes": cfp.nbytes, "crc32": cfp.crc32}
+
+
+def dump_columns(path, ndarr):
+    """write each field of a structured array as a contiguous payload"""
+
+    columns = []
+    fields = []
+    offset = 0
+
+    for name in ndarr.dtype.names:
+        column = np.ascontiguousarray(ndarr[name])
+        offset = _aligned(offset)
+        fields.append([name, np.lib.format.dtype_to_descr(column.dtype),
+                       offset, column.nbytes])
+        columns.append(column)
+        offset += column.nbytes
+
+    # header line is padded so that payloads start aligned
+    header = json.dumps({"shape": list(ndarr.shape), "fields": fields})
+    prefix = len(NPC_MAGIC) + len(header) + 1
+    header += " " * (_aligned(prefix) - prefix)
+
+    with open(path, "wb") as fp:
+        cfp = ChecksumFile(fp)
+        cfp.write(NPC_MAGIC)
+        cfp.write(header.encode("utf-8") + b"\n")
+        offset = 0
+
+        for (_, _, start, nbytes), column in zip(fields, columns):
+            cfp.write(b"\0" * (start - offset))
+            cfp.write(column.tobytes())
+            offset = start + nbytes
+
+    return {"serializer": "npc", "nbytes": cfp.nbytes, "crc32": cfp.crc32}
+
+
+def read_columns_header(data):
+    """return (shape, [(field, dtype, offset, nbytes)], data offset)"""
+
+    pos = data.index(b"\n", len(NPC_MAGIC))
+    header = json.loads(data[len(NPC_MAGIC):pos].decode("utf-8"))
+    fields = [(n, np.lib.format.descr_to_dtype(d), o, l) for n, d, o, l in
+              header["fields"]]
+
+    return tuple(header["shape"]), fields, pos + 1
 
 
 def load(file):
-    bio = BytesIO()
-    bio.write(file.read())
-    bio.seek(0) 
-    return np.load(bio)
 
+    data = file.read()
+
+    if data.startswith(NPC_MAGIC):
+        shape, fields, offset = read_columns_header(data)
+        ndarr = np.empty(shape, dtype=[(n, d) for n, d, _, _ in fields])
+
+        for name, dtype, start, nbytes in fields:
+            ndarr[name] = np.frombuffer(data, dtype=dtype, count=nbytes //
+                    dtype.itemsize, offset=offset+start).reshape(shape)
+
+        return ndarr
 
-def get_slice(slab, key):
-    return slab.__getitem__(tuple(key))
+    return np.load(BytesIO(data))
 
 
-def stack(stacker, lower):
+def load_column(slab_pool, slab_info, header, field, rows=None):
+    """load rows of one field of a columnar slab with one byte-range read"""
 
-    if stacker is None:
-        stacker = np.expand_dims(lower, axis=0)
+    shape, fields, offset = header
+
+    for name, dtype, start, nbytes in fields:
+        if name == field:
+            break
 
     else:
-        stacker = np.append(stacker, np.expand_dims(lower,0), 0)
+        raise KeyError(field)
+
+    rowbytes = dtype.itemsize * int(np.prod(shape[1:], dtype=np.int64))
+
+    if rows is None:
+        rows = slice(0, shape[0] if shape else 1)
 
-    return stacker
+    data = slab_pool.pread(slab_info, (rows.stop - rows.start) * rowbytes,
+                           offset + start + rows.start * rowbytes)
+    column = np.frombuffer(data, dtype=dtype)
 
+    if not shape:
+        return column.reshape(())
 
-def expand_dim(slab):
-    return np.expand_dims(slab, axis=0)
+    return column.reshape((rows.stop - rows.start,) + tuple(shape[1:]))
 
 
-def concatenate(concater, panel,  axis=0):
+def read_header(slab_file):
+    """return (shape, fortran_order, dtype, data offset) of a npy file"""
 
-    if concater is None:
-        return panel
+    version = np.lib.format.read_magic(slab_file)
 
-    if type(concater) != type(panel):
-        raise PE_Stabif_Typemismatch("%s != %s" % (type(concater).__name__,
-                                    type(panel).__name__))
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(slab_file)
 
-    return np.concatenate((concater, panel), axis=axis)
+    elif version == (2, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(slab_file)
+
+    else:
+        return None
 
+    return shape, fortran_order, dtype, slab_file.tell()
 
-def squeeze(array):
-    if DEBUG_LEVEL > DEBUG_INFO:
-        print("Squeeze IN: ", array)
 
-    is_squeezed = False
+def load_rows(slab_pool, slab_info, header, rows):
+    """load rows of a C-ordered npy slab with one byte-range read"""
 
-    if array.shape[0] == 1:
-        array = array[0]
-        is_squeezed = True
+    shape, fortran_order, dtype, offset = header
 
-    if DEBUG_LEVEL > DEBUG_INFO:
-        print("Squeeze OUT(array, is_squeezed): ", array, is_squeezed)
+    rowbytes = dtype.itemsize * int(np.prod(shape[1:], dtype=np.int64))
+    data = slab_pool.pread(slab_info, (rows.stop - rows.start) * rowbytes,
+                           offset + rows.start * rowbytes)
 
-    return is_squeezed, array
+    return np.frombuffer(data, dtype=dtype).reshape(
+                (rows.stop - rows.start,) + tuple(shape[1:]))
@@ -2,9 +2,7 @@
 
 """
 
-import os, io, pickle, shutil
-
-from pyslabs.error import PE_Util_Typemismatch
+import os, io, zlib, pickle, shutil
 
 
 supported_array_types = {
@@ -16,22 +14,27 @@ DEBUG_NONE, DEBUG_MAJOR, DEBUG_MINOR, DEBUG_INFO, DEBUG_ALL = range(5)
 DEBUG_LEVEL = DEBUG_MAJOR
 #DEBUG_LEVEL = DEBUG_ALL
 
-class ScalarList():
+class ChecksumFile():
+    """write-only file wrapper that computes crc32 of the bytes written"""
+
+    def __init__(self, fp):
 
-    def __init__(self, elems=None, type=type(None)):
+        self.fp = fp
+        self.crc32 = 0
+        self.nbytes = 0
 
-        self._list = list(elems)
-        self._type = type
+    def write(self, data):
 
-    def concat(self, elem):
+        self.crc32 = zlib.crc32(data, self.crc32)
+        self.nbytes += memoryview(data).nbytes
 
-        self._list.append(elem)
+        return self.fp.write(data)
 
-        if self._type is type(None):
-            self._type = type(elem)
+    def flush(self):
+        self.fp.flush()
 
-        elif self._type is not type(elem):
-            raise PE_Util_Typemismatch("%s != %s" % (self._type, type(elem)))
+    def fileno(self):
+        return self.fp.fileno()
 
 
 def arraytype(slab):
@@ -42,6 +45,44 @@ def arraytype(slab):
     return "pickle", "dat"
 
 
+def slab_levels(slab_name):
+    """return (first level, number of levels) of a slab file name
+
+    A slab of several stack levels is named "<first>_<count>.<atype>.<ext>".
+    """
+
+    level = slab_name.split(".")[0]
+
+    if "_" in level:
+        first, count = level.split("_")
+        return int(first), int(count)
+
+    return int(level), 1
+
+
+def tiling(shape, tiles):
+    """return the list of (start, slab shape) of the tiles of shape
+
+    tiles is a tile length per dimension, or one for all; None, or no
+    length, keeps a dimension in one tile.
+    """
+
+    if isinstance(tiles, int):
+        tiles = (tiles,) * len(shape)
+
+    tiles = (tuple(tiles) + (None,) * len(shape))[:len(shape)]
+    spans = [[(st, min(t or ln, ln - st)) for st in range(0, ln, t or ln)]
+             for t, ln in zip(tiles, shape)]
+
+    starts = [()]
+
+    for span in spans:
+        starts = [s + (item,) for s in starts for item in span]
+
+    return [(tuple(s[0] for s in tile), tuple(s[1] for s in tile))
+            for tile in starts]
+
+
 def pickle_dump(path, obj):
     with io.open(path, "wb") as fp:
         pickle.dump(obj, fp)
@@ -6,7 +6,17 @@
 import os
 from pyslabs import slabif
 from pyslabs.util import arraytype
-from pyslabs.error import PE_Slab_Shapemismatch, PE_Write_Duplicateslabfile
+from pyslabs.error import (PE_Slab_Shapemismatch, PE_Write_Duplicateslabfile,
+                           PE_Write_Unknownlayout, PE_Write_Notstackable,
+                           PE_Write_Unknownpencil)
+
+
+def check_layout(layout):
+
+    if layout in (None, "row", "columnar"):
+        return layout
+
+    raise PE_Write_Unknownlayout(str(layout))
 
 
 class VariableWriterV1():
@@ -32,8 +42,24 @@ class VariableWriterV1():
 
     def write(self, slab, start=None, level=None):
 
-        # get slab info
-        slab_shape = slabif.shape(slab)
+        self._write(slab, slabif.shape(slab), start, level, None)
+
+    def write_levels(self, block, start=None, level=None):
+        """write consecutive stack levels of a block as one slab
+
+        The leading axis of the numpy block is the stack axis.
+        """
+
+        if arraytype(block)[0] != "numpy" or block.ndim < 1:
+            raise PE_Write_Notstackable(type(block).__name__)
+
+        self._write(block, block.shape[1:], start, level, block.shape[0])
+
+    def _write(self, slab, slab_shape, start, level, nlevels):
+
+        # pencils are built from npy slabs only
+        if "pencils" in self.config and arraytype(slab)[0] != "numpy":
+            raise PE_Write_Unknownpencil(type(slab).__name__)
 
         # normalize start 
         if start is None:
@@ -53,31 +79,58 @@ class VariableWriterV1():
 
         strlevel = str(self.level) if level is None else str(level)
 
-        if strlevel in self.config["writes"]:
-            writes = self.config["writes"][strlevel]
-
-        else:
-            writes = {}
-            self.config["writes"][strlevel] = writes
-
-        writes["/".join(rel_path)] = (start, slab_shape)
-
         slab_folder = os.path.join(self.path, *rel_path)
-
-        if not os.path.isdir(slab_folder):
-            os.makedirs(slab_folder)
+        os.makedirs(slab_folder, exist_ok=True)
 
         atype, ext = arraytype(slab)
-        slab_path = os.path.join(slab_folder, ".".join([strlevel, atype, ext]))
+        layout = self.config.get("layout", None)
+
+        if layout == "columnar" and atype == "numpy" and slab.dtype.names:
+            ext = "npc"
+
+        slab_levels = (strlevel if nlevels is None else
+                       "%s_%d" % (strlevel, nlevels))
+        slab_name = ".".join([slab_levels, atype, ext])
+        slab_path = os.path.join(slab_folder, slab_name)
 
         if os.path.isfile(slab_path):
             raise PE_Write_Duplicateslabfile(slab_path)
 
-        slabif.dump(slab_path, slab)
+        # manifest entry of the slab keyed by its path in the variable
+        write = {
+            "start": tuple(start),
+            "shape": tuple(slab_shape),
+            "level": int(strlevel),
+            "dtype": slabif.dtype(slab)
+        }
+
+        if nlevels is not None:
+            write["levels"] = nlevels
+
+        # summary statistics while the slab is still in cache
+        if self.config.get("stats", False):
+            stats = slabif.stats(slab)
+
+            if stats is not None:
+                write["stats"] = stats
+                write["range"] = [stats["min"], stats["max"],
+                                  stats["nans"] > 0]
+
+        elif self.config.get("ranges", False):
+            value_range = slabif.value_range(slab)
+
+            if value_range is not None:
+                write["range"] = value_range
+
+        write.update(slabif.dump(slab_path, slab, layout=layout))
+
+        self.config["writes"]["/".join(rel_path + [slab_name])] = write
 
         if level is None:
+            nlevel = 1 if nlevels is None else nlevels
+
             if self.auto_stack is True:
-                self.stacking()
+                self.stacking(nlevel=nlevel)
 
             elif self.auto_stack > 0:
-                self.stacking(nlevel=self.auto_stack)
+                self.stacking(nlevel=self.auto_stack * nlevel)
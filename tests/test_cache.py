@@ -0,0 +1,137 @@
+import os, shutil, pytest
+import numpy as np
+import pyslabs
+
+here = os.path.dirname(__file__)
+prjdir = os.path.join(here, "workdir")
+workdir = os.path.join(prjdir, "slabs")
+slabfile = os.path.join(prjdir, "test.slab")
+slabfile2 = os.path.join(prjdir, "test2.slab")
+
+NITER = 8
+
+
+@pytest.fixture(autouse=True)
+def run_around_tests():
+
+    # before test
+    if os.path.isdir(workdir):
+        shutil.rmtree(workdir)
+
+    for path in (slabfile, slabfile2):
+        if os.path.isfile(path):
+            os.remove(path)
+
+    # the test
+    yield
+
+
+    # after test
+    for path in (slabfile, slabfile2):
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+def writefile(path, value):
+
+    with pyslabs.open(path, "w") as slabs:
+        myvar = slabs.get_writer("myvar", autostack=True)
+
+        for i in range(NITER):
+            myvar.write(np.full(100, value+i, dtype=np.float64))
+
+
+def test_budget():
+
+    writefile(slabfile, 0)
+
+    # room for three slabs of 800 bytes
+    with pyslabs.open(slabfile, cache_size=2500) as slabs:
+        myvar = slabs.get_reader("myvar")
+
+        myvar[0]
+        myvar[0]
+        info = myvar.cache_info()
+        assert (info["hits"], info["misses"], info["count"]) == (1, 1, 1)
+
+        myvar[:]
+        info = slabs.cache_info()
+        assert info["count"] == 3
+        assert info["nbytes"] <= 2500
+        assert info["evictions"] == NITER - 3
+
+        myvar[NITER-1]
+        assert slabs.cache_info()["hits"] == 3
+
+        slabs.cache_clear()
+        assert slabs.cache_info()["nbytes"] == 0
+
+
+def test_shared(monkeypatch):
+
+    writefile(slabfile, 0)
+    writefile(slabfile2, 100)
+
+    cache = pyslabs.SlabCache(budget=10000)
+
+    with pyslabs.open(slabfile, cache=cache) as slabs1:
+        with pyslabs.open(slabfile2, cache=cache) as slabs2:
+            var1 = slabs1.get_reader("myvar")
+            var2 = slabs2.get_reader("myvar")
+
+            assert np.all(var1[2] == 2)
+            assert np.all(var2[2] == 102)
+            assert cache.info()["count"] == 2
+
+        assert cache.info()["count"] == 1
+
+    assert cache.info()["count"] == 0
+
+    with pyslabs.open(slabfile, cache="shared") as slabs:
+        slabs.get_array("myvar")
+        assert pyslabs.shared_cache().info()["count"] == NITER
+
+    # the budget of the first open, raised by larger budgets only
+    monkeypatch.setattr(pyslabs.cache, "_shared_cache", None)
+
+    with pyslabs.open(slabfile, cache="shared", cache_size=2500) as slabs:
+        assert slabs.cache.budget == 2500
+
+        with pyslabs.open(slabfile2, cache="shared", cache_size=1000) as s2:
+            assert s2.cache is slabs.cache
+            assert s2.cache.budget == 2500
+
+        with pyslabs.open(slabfile2, cache="shared", cache_size=5000) as s2:
+            assert slabs.cache.budget == 5000
+
+
+def test_readahead():
+
+    writefile(slabfile, 0)
+
+    with pyslabs.open(slabfile, readahead=2) as slabs:
+        myvar = slabs.get_reader("myvar")
+
+        for i in range(NITER):
+            assert np.all(myvar[i] == i)
+
+        info = myvar.readahead_info()
+        assert info["window"] == 2
+        assert info["issued"] == NITER - 2
+        assert info["hits"] == NITER - 2
+        assert info["hit rate"] == 1.0
+
+        # random access does not trigger read-ahead
+        myvar[3]
+        myvar[1]
+        assert myvar.readahead_info()["issued"] == NITER - 2
+        assert len(myvar._prefetched) == 0
+
+    # read-ahead is off by default
+    with pyslabs.open(slabfile) as slabs:
+        myvar = slabs.get_reader("myvar")
+
+        for i in range(NITER):
+            myvar[i]
+
+        assert myvar.readahead_info()["issued"] == 0
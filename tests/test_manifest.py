@@ -0,0 +1,239 @@
+import os, shutil, pytest
+import numpy as np
+import pyslabs
+
+here = os.path.dirname(__file__)
+prjdir = os.path.join(here, "workdir")
+workdir = os.path.join(prjdir, "slabs")
+slabfile = os.path.join(prjdir, "test.slab")
+
+NITER = 4
+
+
+@pytest.fixture(autouse=True)
+def run_around_tests():
+
+    # before test
+    if os.path.isdir(workdir):
+        shutil.rmtree(workdir)
+
+    if os.path.isfile(slabfile):
+        os.remove(slabfile)
+
+    # the test
+    yield
+
+
+    # after test
+    if os.path.isfile(slabfile):
+        os.remove(slabfile)
+
+
+def test_manifest():
+
+    data = np.arange(NITER*6*5, dtype=np.float32).reshape((NITER, 6, 5))
+
+    with pyslabs.open(slabfile, "w") as slabs:
+        fvar = slabs.get_writer("fvar", (NITER, 6, 5), autostack=True)
+        lvar = slabs.get_writer("lvar", autostack=True)
+
+        for i in range(NITER):
+            fvar.write(data[i, :4], 0)
+            fvar.write(data[i, 4:], 4, level=i)
+            lvar.write([i, i+1, i+2])
+
+    with pyslabs.open(slabfile) as slabs:
+        fvar = slabs.get_reader("fvar")
+
+        assert fvar.dtype == np.float32
+        assert fvar.serializer == "npy"
+        assert fvar.shape == (NITER, 6, 5)
+        assert len(fvar.manifest) == 2 * NITER
+
+        write = fvar.manifest["4_2/0_5/3.numpy.npy"]
+        assert tuple(write["start"]) == (4, 0)
+        assert tuple(write["shape"]) == (2, 5)
+        assert write["level"] == 3
+
+        sizes = slabs.info("slab")["fvar"]
+        assert fvar.nbytes == sizes[1]
+
+        info = slabs.info("var", "lvar")
+        assert info["dtype"] == "int"
+        assert info["serializer"] == "array"
+        assert info["slab count"] == NITER
+
+
+def test_checksum():
+
+    data = np.arange(NITER*8, dtype=np.float64).reshape((NITER, 8))
+
+    with pyslabs.open(slabfile, "w") as slabs:
+        myvar = slabs.get_writer("myvar", autostack=True)
+
+        for i in range(NITER):
+            myvar.write(data[i])
+
+    with pyslabs.open(slabfile) as slabs:
+        assert slabs.verify(workers=2) == []
+        member = slabs.slab_tower["myvar"]["0_8"]["2.numpy.npy"]
+        offset = member.offset_data + member.size - 1
+
+    with open(slabfile, "r+b") as fp:
+        fp.seek(offset)
+        fp.write(b"\xff")
+
+    with pyslabs.open(slabfile) as slabs:
+        assert slabs.verify() == [("myvar/0_8/2.numpy.npy",
+                                   "checksum mismatch")]
+
+        myvar = slabs.get_reader("myvar")
+        assert np.array_equal(myvar[1], data[1])
+        assert not np.array_equal(myvar[2], data[2])
+
+    with pyslabs.open(slabfile, verify=True) as slabs:
+        myvar = slabs.get_reader("myvar")
+        assert np.array_equal(myvar[1], data[1])
+
+        with pytest.raises(pyslabs.error.PE_Read_Checksummismatch):
+            myvar[2]
+
+
+@pytest.mark.parametrize("shard", [None, "var"])
+def test_lazyconfig(shard):
+
+    NVARS = 50
+
+    with pyslabs.open(slabfile, "w", shard=shard) as slabs:
+        for n in range(NVARS):
+            myvar = slabs.get_writer("var%d" % n, autostack=True,
+                                     attr_index=n)
+            myvar.write(np.full(3, n))
+
+    with pyslabs.open(slabfile) as slabs:
+        member = slabs.tar_file.getmember(pyslabs.const.CONFIG_FILE)
+        cfgdata = slabs.tar_file.extractfile(member).read()
+        assert cfgdata.startswith(pyslabs.const.CONFIG_MAGIC)
+
+        assert len(slabs.config["vars"]) == NVARS
+        assert slabs.config["vars"].ndecoded() == 0
+
+        myvar = slabs.get_reader("var7")
+        assert slabs.config["vars"].ndecoded() == 1
+        assert myvar.var_cfg["attrs"]["index"] == 7
+        assert np.array_equal(myvar[0], np.full(3, 7))
+
+    if shard is not None:
+        for n in range(NVARS):
+            os.remove(os.path.join(prjdir, "test.%d.slab" % n))
+
+
+def test_notserializable():
+
+    slabs = pyslabs.open(slabfile, "w")
+
+    # attrs are checked before any slab is written
+    with pytest.raises(pyslabs.error.PE_Config_Notserializable):
+        slabs.get_writer("myvar", autostack=True, attr_obj=object())
+
+    with pytest.raises(pyslabs.error.PE_Config_Notserializable):
+        slabs.define_dim("x", 3, attr_obj=object())
+
+    myvar = slabs.get_writer("myvar", autostack=True, attr_pos=(1, 2),
+                             attr_keys={1: "a"})
+    myvar.write([1, 2, 3])
+    slabs.close()
+
+    with pyslabs.open(slabfile) as slabs:
+        attrs = slabs.get_reader("myvar").var_cfg["attrs"]
+        assert attrs["pos"] == [1, 2]
+        assert attrs["keys"] == {"1": "a"}
+
+
+def test_pickledconfig(monkeypatch, capsys):
+
+    import io, sys, pickle, tarfile
+    from pyslabs.command import main
+
+    # a slab file of an older version: pickled config and no manifest
+    config = {"version": 1, "dims": {}, "attrs": {}, "vars": {"myvar": {
+              "shape": [2, 3], "attrs": {}, "stack": {"auto": True}}}}
+    members = [(pyslabs.const.CONFIG_FILE, pickle.dumps(config))]
+
+    for level in range(2):
+        buf = io.BytesIO()
+        np.save(buf, np.arange(3.0) + level)
+        members.append(("myvar/0_3/%d.numpy.npy" % level, buf.getvalue()))
+
+    with tarfile.open(slabfile, "w") as tar:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    # pickled configs of older files are loaded only if allowed
+    with pytest.raises(pyslabs.error.PE_Config_Pickled):
+        pyslabs.open(slabfile)
+
+    with pyslabs.open(slabfile, allow_pickle=True) as slabs:
+        assert np.array_equal(slabs.get_array("myvar")[1], [1, 2, 3])
+
+        # slab sizes of the members without a manifest
+        info = slabs.info("var", "myvar")
+        assert info["slab count"] == 2
+        assert info["total bytes"] == sum(len(d) for _, d in members[1:])
+
+    monkeypatch.setattr(sys, "argv", ["slabs", "info", "-v", "myvar",
+                                      slabfile])
+    assert main() == 1
+    assert "--allow-pickle" in capsys.readouterr().err
+
+    monkeypatch.setattr(sys, "argv", ["slabs", "info", "--allow-pickle",
+                                      "-v", "myvar", slabfile])
+    assert main() == 0
+    assert "slab count: 2" in capsys.readouterr().out
+
+
+def test_stats():
+
+    data = np.arange(NITER*6*5, dtype=np.float64).reshape((NITER, 6, 5))
+    data[1, 2, 3] = np.nan
+
+    with pyslabs.open(slabfile, "w") as slabs:
+        fvar = slabs.get_writer("fvar", (NITER, 6, 5), autostack=True,
+                                stats=True)
+        lvar = slabs.get_writer("lvar", autostack=True, stats=True)
+        nvar = slabs.get_writer("nvar", autostack=True)
+
+        for i in range(NITER):
+            fvar.write(data[i, :3], 0)
+            fvar.write(data[i, 3:], 3, level=i)
+            lvar.write([i, i+1, i+2])
+            nvar.write(data[i])
+
+    with pyslabs.open(slabfile) as slabs:
+        stats = slabs.stats("fvar")
+        assert stats["min"] == 0
+        assert stats["max"] == data.size - 1
+        assert stats["nans"] == 1
+        assert stats["count"] == data.size
+        assert stats["sum"] == np.nansum(data)
+        assert stats["mean"] == np.nanmean(data)
+        assert stats["slabs"] == 2 * NITER
+        assert stats["exact"] is True
+
+        stats = slabs.stats("fvar", (slice(2, 4), slice(3, 6)))
+        assert stats["exact"] is True
+        assert stats["max"] == data[3, 3:].max()
+
+        assert slabs.stats("fvar", (2, 4))["exact"] is False
+
+        stats = slabs.stats("lvar")
+        assert (stats["min"], stats["max"]) == (0, NITER + 1)
+
+        assert slabs.stats("nvar") is None
+
+        info = slabs.info("var", "fvar")
+        assert info["min value"] == 0
+        assert info["nan count"] == 1
+        assert "min value" not in slabs.info("var", "nvar")
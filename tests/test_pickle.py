@@ -26,7 +26,8 @@ def run_around_tests():
 
 
     # after test
-    os.remove(slabfile)
+    if os.path.isfile(slabfile):
+        os.remove(slabfile)
 
 def f(x):
     return x*x
@@ -58,6 +59,109 @@ def test_tuple():
     with pyslabs.open(slabfile) as slabs:
         myarr = slabs.get_array("myvar")
 
+        # empty selections keep the container type
+        myvar = slabs.get_reader("myvar")
+        assert myvar[1:1] == ()
+        assert myvar[:, 3:] == ((), ())
+
     assert type(myarr) == type(data0)
     assert myarr[0] == data0
     assert myarr[1] == data1
+
+
+def test_typed():
+
+    ints = [list(range(i, i+100)) for i in range(NITER)]
+    flags = [tuple((j+i) % 2 == 0 for j in range(4)) for i in range(NITER)]
+    mixed = [[1, 2.0, "3"] for i in range(NITER)]
+
+    with pyslabs.open(slabfile, mode="w") as slabs:
+        ivar = slabs.get_writer("ivar", autostack=True)
+        bvar = slabs.get_writer("bvar", autostack=True)
+        mvar = slabs.get_writer("mvar", autostack=True)
+
+        for i in range(NITER):
+            ivar.write(ints[i])
+            bvar.write(flags[i])
+            mvar.write(mixed[i])
+
+    with pyslabs.open(slabfile) as slabs:
+        assert slabs.info("var", "ivar")["serializer"] == "array"
+        assert slabs.info("var", "bvar")["serializer"] == "array"
+        assert slabs.info("var", "mvar")["serializer"] == "pickle"
+
+        # eight bytes per int plus a small header
+        assert slabs.get_reader("ivar").nbytes < NITER * (8 * 100 + 128)
+
+        ivar = slabs.get_reader("ivar")
+        assert ivar[2] == ints[2]
+        assert ivar[1:4, 10:90:7] == [r[10:90:7] for r in ints[1:4]]
+        assert ivar[3, -1] == ints[3][-1]
+
+        bvar = slabs.get_reader("bvar")
+        assert bvar[1] == flags[1]
+        assert type(bvar[1]) is tuple and type(bvar[1][0]) is bool
+
+        assert slabs.get_array("mvar")[4] == mixed[4]
+
+
+def test_typedheader():
+
+    # a header of many nested containers is longer than a npy header
+    nested = 1
+
+    for i in range(400):
+        nested = [nested]
+
+    with pyslabs.open(slabfile, mode="w") as slabs:
+        myvar = slabs.get_writer("myvar", autostack=True)
+        myvar.write(nested)
+        myvar.write(nested)
+
+    with pyslabs.open(slabfile) as slabs:
+        assert slabs.info("var", "myvar")["serializer"] == "array"
+        assert slabs.get_array("myvar")[1] == nested
+
+
+def test_outofband():
+
+    import numpy as np
+
+    records = [[np.arange(20000) + i, np.full(10, i)] for i in range(NITER)]
+
+    with pyslabs.open(slabfile, mode="w") as slabs:
+        myvar = slabs.get_writer("myvar", autostack=True)
+
+        for i in range(NITER):
+            myvar.write(records[i])
+
+    with pyslabs.open(slabfile) as slabs:
+        assert slabs.info("var", "myvar")["serializer"] == "pickle5"
+
+        item = slabs.get_reader("myvar")[2]
+        assert np.array_equal(item[0], records[2][0])
+        assert np.array_equal(item[1], records[2][1])
+
+        # arrays are writable and not shared with the slab cache
+        item[0][0] = -1
+        assert slabs.get_reader("myvar")[2][0][0] == records[2][0][0]
+
+
+def test_manybuffers():
+
+    import numpy as np
+    from pyslabs.const import OOB_MINSIZE
+
+    # the buffer offsets make a header longer than a npy header
+    records = [np.full(OOB_MINSIZE//8, i, dtype=np.float64) for i in range(400)]
+
+    with pyslabs.open(slabfile, mode="w") as slabs:
+        myvar = slabs.get_writer("myvar", autostack=True)
+        myvar.write(records)
+
+    with pyslabs.open(slabfile) as slabs:
+        assert slabs.info("var", "myvar")["serializer"] == "pickle5"
+
+        items = slabs.get_array("myvar")[0]
+        assert len(items) == len(records)
+        assert all(np.array_equal(a, b) for a, b in zip(items, records))
@@ -0,0 +1,115 @@
+import os, sys, shutil, pytest
+import numpy as np
+import pyslabs
+
+here = os.path.dirname(__file__)
+prjdir = os.path.join(here, "workdir")
+workdir = os.path.join(prjdir, "slabs")
+slabfile = os.path.join(prjdir, "test.slab")
+outfile = os.path.join(prjdir, "rechunked.slab")
+
+NITER = 10
+
+
+@pytest.fixture(autouse=True)
+def run_around_tests():
+
+    # before test
+    if os.path.isdir(workdir):
+        shutil.rmtree(workdir)
+
+    for path in (slabfile, outfile):
+        if os.path.isfile(path):
+            os.remove(path)
+
+    # the test
+    yield
+
+
+    # after test
+    for path in (slabfile, outfile):
+        if os.path.isfile(path):
+            os.remove(path)
+
+
+def writefile():
+
+    temp = np.arange(NITER*6*4, dtype=np.float64).reshape((NITER, 6, 4))
+
+    with pyslabs.open(slabfile, "w") as slabs:
+        tvar = slabs.get_writer("temp", (NITER, 6, 4), autostack=True,
+                                attr_units="K")
+        lvar = slabs.get_writer("label", autostack=True)
+
+        for i in range(NITER):
+            tvar.write(temp[i, :3], (0, 0))
+            tvar.write(temp[i, 3:], (3, 0), level=i)
+            lvar.write(["a%d" % i, "b%d" % i])
+
+    return temp
+
+
+@pytest.mark.parametrize("workers", [None, 3])
+def test_rechunk(workers):
+
+    temp = writefile()
+
+    pyslabs.rechunk(slabfile, outfile, tiles=(2, None), levels_per_slab=4,
+                    workers=workers)
+
+    with pyslabs.open(outfile) as slabs:
+        tvar = slabs.get_reader("temp")
+        assert tvar.shape == (NITER, 6, 4)
+        assert tvar.var_cfg["attrs"]["units"] == "K"
+
+        # three tiles by three slabs of up to four levels
+        assert len(tvar.manifest) == 9
+        write = tvar.manifest["2_2/0_4/8_2.numpy.npy"]
+        assert (write["level"], write["levels"]) == (8, 2)
+
+        # value ranges are recorded only on request
+        assert "range" not in write
+
+        assert np.array_equal(tvar[:], temp)
+        assert np.array_equal(tvar[:, 3, 1], temp[:, 3, 1])
+        assert np.array_equal(tvar[9:1:-3, 1:5], temp[9:1:-3, 1:5])
+        assert np.array_equal(tvar[5], temp[5])
+        assert np.allclose(slabs.reduce("temp", "mean", axis=0),
+                           temp.mean(axis=0))
+        assert slabs.select_levels("temp", (">", 200)) == [8, 9]
+
+        label = slabs.get_array("label")
+        assert label[3] == ["a3", "b3"]
+
+
+def test_command(monkeypatch):
+
+    from pyslabs.command import main
+
+    temp = writefile()
+
+    monkeypatch.setattr(sys, "argv", ["slabs", "rechunk", slabfile, outfile,
+                        "--tiles", "1,1", "--levels-per-slab", "5",
+                        "--vars", "temp", "--pencils", "3"])
+    assert main() == 0
+
+    with pyslabs.open(outfile) as slabs:
+        assert list(slabs.info("list")) == ["temp"]
+
+        tvar = slabs.get_reader("temp")
+        assert len(tvar.manifest) == 2 * 6 * 4
+        assert np.array_equal(tvar[:, 4, 2], temp[:, 4, 2])
+
+        # pencils of 3 by 3 over all stack levels
+        assert len(tvar.pencils.manifest) == 2 * 2
+        assert np.array_equal(tvar[:, 5, 3], temp[:, 5, 3])
+
+    # pencil lengths are positive integers
+    for pencils in ("4,", ",2", "0", "a"):
+        monkeypatch.setattr(sys, "argv", ["slabs", "rechunk", slabfile,
+                            outfile, "--pencils", pencils])
+
+        with pytest.raises(SystemExit) as exc:
+            main()
+
+        assert exc.value.code == 2
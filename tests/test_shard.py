@@ -0,0 +1,76 @@
+import os, glob, shutil, pytest
+import numpy as np
+import pyslabs
+
+here = os.path.dirname(__file__)
+prjdir = os.path.join(here, "workdir")
+workdir = os.path.join(prjdir, "slabs")
+slabfile = os.path.join(prjdir, "test.slab")
+shardfiles = os.path.join(prjdir, "test.*.slab")
+
+NITER = 6
+
+
+@pytest.fixture(autouse=True)
+def run_around_tests():
+
+    # before test
+    if os.path.isdir(workdir):
+        shutil.rmtree(workdir)
+
+    for path in glob.glob(slabfile) + glob.glob(shardfiles):
+        os.remove(path)
+
+    # the test
+    yield
+
+
+    # after test
+    for path in glob.glob(slabfile) + glob.glob(shardfiles):
+        os.remove(path)
+
+
+def writefile(shard):
+
+    temp = np.arange(NITER*4*5).reshape((NITER, 4, 5))
+    pres = np.arange(NITER*3).reshape((NITER, 3)) * 0.5
+
+    with pyslabs.open(slabfile, "w", shard=shard) as slabs:
+        tvar = slabs.get_writer("temp", (NITER, 4, 5), autostack=True)
+        pvar = slabs.get_writer("pres", (NITER, 3), autostack=True)
+
+        for i in range(NITER):
+            tvar.write(temp[i, :2], 0)
+            tvar.write(temp[i, 2:], 2, level=i)
+            pvar.write(pres[i])
+
+    return temp, pres
+
+
+@pytest.mark.parametrize("shard, nshards", [
+    ("var", 2), (("stack", 4), 2), ({"size": 1}, 3*NITER)])
+def test_shard(shard, nshards):
+
+    temp, pres = writefile(shard)
+
+    assert len(glob.glob(shardfiles)) == nshards
+
+    with pyslabs.open(slabfile, maxopen=1) as slabs:
+        assert slabs.slab_pool.nopen() == 0
+
+        assert np.array_equal(slabs.get_array("temp"), temp)
+        assert np.array_equal(slabs.get_array("pres"), pres)
+
+        tvar = slabs.get_reader("temp")
+        assert np.array_equal(tvar[3, 1:3, ::2], temp[3, 1:3, ::2])
+
+        assert slabs.slab_pool.nopen() == 1
+
+        nslabs, total, _, _ = slabs.info("slab")["temp"]
+        assert nslabs == 2 * NITER
+
+
+def test_unknownpolicy():
+
+    with pytest.raises(pyslabs.error.PE_Shard_Unknownpolicy):
+        pyslabs.open(slabfile, "w", shard=("level", 2))
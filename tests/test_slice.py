@@ -1,4 +1,4 @@
-import os, shutil, pytest, random, time
+import os, shutil, pytest, random, time, itertools
 import pyslabs
 
 here = os.path.dirname(__file__)
@@ -433,3 +433,656 @@ def ttest_failecases():
 #            print("PASS: get_array match")
 
 # TODO: random, stress test
+
+
+def writetiles(data, tiles):
+
+    with pyslabs.open(slabfile, "w") as slabs:
+        ndata = slabs.get_writer("ndata", data.shape, autostack=True)
+
+        for i in range(data.shape[0]):
+            for start in itertools.product(*[range(0, s, t) for s, t in
+                                             zip(data.shape[1:], tiles)]):
+                key = tuple(slice(st, st+t) for st, t in zip(start, tiles))
+                ndata.write(data[(i,)+key], start=start, level=i)
+
+
+def test_numpy_key():
+
+    import numpy as np
+
+    data = np.arange(6*7*9, dtype=np.float32).reshape((6, 7, 9))
+    writetiles(data, (3, 4))
+
+    with pyslabs.open(slabfile) as slabs:
+        ndata = slabs.get_reader("ndata")
+
+        for _ in range(200):
+            key = []
+            for length in data.shape[:random.randint(1, 3)]:
+                if random.random() < 0.3:
+                    key.append(random.randrange(-length, length))
+                else:
+                    key.append(slice(random.randrange(-length, length),
+                                     random.choice([None, random.randrange(
+                                     -length, length+2)]),
+                                     random.randint(1, 4)))
+            key = tuple(key)
+
+            assert np.array_equal(ndata[key], data[key]), key
+
+        out = np.zeros((2, 7), dtype=np.float32)
+        assert slabs.get_array("ndata", (slice(1, 5, 2), slice(None), 4),
+                               out=out) is out
+        assert np.array_equal(out, data[1:5:2, :, 4])
+
+        with pytest.raises(pyslabs.error.PE_Read_Outshape):
+            ndata.get_array((1, 2), out=out)
+
+    os.remove(slabfile)
+
+
+def test_rowrange():
+
+    import numpy as np
+
+    data = np.arange(3*400*50, dtype=np.float64).reshape((3, 400, 50))
+    writetiles(data, (200, 50))
+
+    with pyslabs.open(slabfile) as slabs:
+        ndata = slabs.get_reader("ndata")
+        pool = slabs.slab_pool
+
+        nbytes = pool.nbytes
+        assert np.array_equal(ndata[1, 10:12, :], data[1, 10:12, :])
+        assert pool.nbytes - nbytes < 2 * 50 * 8 + 2 * 4096
+
+        nbytes = pool.nbytes
+        assert np.array_equal(ndata[:, 198:203:2, 3], data[:, 198:203:2, 3])
+        assert pool.nbytes - nbytes < 3 * 2 * 3 * 50 * 8 + 6 * 4096
+
+        assert np.array_equal(ndata[2, 150], data[2, 150])
+
+        # whole slabs are loaded and cached
+        assert np.array_equal(ndata[0, :, 7], data[0, :, 7])
+        nbytes = pool.nbytes
+        assert np.array_equal(ndata[0, 10:12, :], data[0, 10:12, :])
+        assert pool.nbytes == nbytes
+
+    os.remove(slabfile)
+
+
+def test_workers():
+
+    import numpy as np
+
+    data = np.arange(40*6*8, dtype=np.int32).reshape((40, 6, 8))
+    writetiles(data, (3, 4))
+
+    for workers in (1, 8):
+        with pyslabs.open(slabfile, workers=workers) as slabs:
+            ndata = slabs.get_reader("ndata")
+
+            # the thread pool is created at the first parallel fetch
+            assert slabs._executor is None
+            assert np.array_equal(ndata[0, 0, 0], data[0, 0, 0])
+            assert slabs._executor is None
+
+            assert np.array_equal(ndata[:], data)
+            assert (slabs._executor is None) == (workers == 1)
+            assert np.array_equal(ndata[5:35:3, 2:5, 1], data[5:35:3, 2:5, 1])
+
+    os.remove(slabfile)
+
+
+def test_lazy():
+
+    import numpy as np
+
+    data = np.arange(20*30*8, dtype=np.float64).reshape((20, 30, 8))
+    writetiles(data, (10, 8))
+
+    with pyslabs.open(slabfile) as slabs:
+        ndata = slabs.get_reader("ndata")
+        pool = slabs.slab_pool
+
+        nbytes = pool.nbytes
+        lazy = ndata.lazy()[2:18][:, 5:25:2][3, ::3, -1]
+        assert pool.nbytes == nbytes
+
+        assert lazy.shape == data[2:18][:, 5:25:2][3, ::3, -1].shape
+        assert lazy.dtype == data.dtype
+        assert lazy.ndim == 1
+
+        assert np.array_equal(lazy.compute(),
+                              data[2:18][:, 5:25:2][3, ::3, -1])
+        assert pool.nbytes - nbytes < 2 * (8 * 10 * 8 + 4096)
+
+        lazy = ndata.lazy()[-3:][1]
+        assert np.array_equal(np.asarray(lazy), data[-3:][1])
+
+        out = np.empty((30, 8))
+        assert ndata.lazy()[4].compute(out=out) is out
+        assert np.array_equal(out, data[4])
+
+    os.remove(slabfile)
+
+
+def test_iter_stack():
+
+    import numpy as np
+
+    data = np.arange(23*6*8, dtype=np.float64).reshape((23, 6, 8))
+    writetiles(data, (3, 8))
+
+    with pyslabs.open(slabfile, cache_size=0) as slabs:
+        ndata = slabs.get_reader("ndata")
+
+        for prefetch in (0, 1, 3):
+            blocks = list(ndata.iter_stack(key=(slice(None), 2, slice(1, 5)),
+                                           chunk=5, prefetch=prefetch))
+            assert [len(b) for b in blocks] == [5, 5, 5, 5, 3]
+            assert np.array_equal(np.concatenate(blocks), data[:, 2, 1:5])
+
+        blocks = list(ndata.iter_stack(key=slice(20, 2, 1), chunk=4))
+        assert blocks == []
+
+        blocks = ndata.iter_stack(key=(slice(3, 20, 2),), chunk=3)
+        assert np.array_equal(next(blocks), data[3:9:2])
+        blocks.close()
+
+    os.remove(slabfile)
+
+
+def test_tileindex():
+
+    import numpy as np
+
+    data = np.arange(2*60*40).reshape((2, 60, 40))
+    writetiles(data, (4, 5))
+
+    with pyslabs.open(slabfile) as slabs:
+        ndata = slabs.get_reader("ndata")
+        assert slabs.get_reader("ndata") is ndata
+
+        index = ndata.index
+        assert index.levels == [0, 1]
+        assert len(list(index.tiles())) == 15 * 8
+
+        tiles = list(index.query([range(9, 13), 17]))
+        assert [t[0] for t in tiles] == [(8, 15), (12, 15)]
+
+        tiles = list(index.query([range(1, 60, 8), range(0, 40, 20)]))
+        assert len(tiles) == 8 * 2
+
+        assert np.array_equal(ndata[1, 9:13, 17], data[1, 9:13, 17])
+
+    os.remove(slabfile)
+
+
+def test_general_key():
+
+    import numpy as np
+
+    data = np.arange(5*40*30, dtype=np.int64).reshape((5, 40, 30))
+    writetiles(data, (8, 10))
+
+    keys = [
+        (slice(None, None, -1),),
+        (slice(4, 0, -2), slice(-3, 2, -7), slice(None, None, -4)),
+        (Ellipsis, 7),
+        (2, Ellipsis, slice(5, None, -3)),
+        (None, 1, None, slice(3, 9), None),
+        (slice(None, None, -1), [3, 30, 12, 3, -1]),
+        (1, [4, 2], [5, 29]),
+        ([0, 4], slice(None), [1, 2]),
+        ([[0, 1], [2, 3]], 5, Ellipsis),
+        (data[:, 0, 0] % 2 == 0,),
+        (3, data[3] % 7 == 0),
+        (np.array([4, 0]), None, Ellipsis, np.array([[1], [2]])),
+        (slice(2, 4), slice(1, 1)),
+    ]
+
+    with pyslabs.open(slabfile) as slabs:
+        ndata = slabs.get_reader("ndata")
+
+        for key in keys:
+            assert np.array_equal(ndata[key], data[key]), key
+
+        sels, residual = pyslabs.read._plan_key(
+            (slice(None, None, -1), [3, 21, 25], 4), ndata.shape)
+        assert len(ndata._plan(sels)) == 5 * 3
+
+        out = np.empty((2, 5), dtype=np.int64)
+        assert ndata.get_array((1, [4, 2], slice(5, 10)), out=out) is out
+        assert np.array_equal(out, data[1, [4, 2], 5:10])
+
+        with pytest.raises(pyslabs.error.PE_Read_Exeedlength):
+            ndata[:, [0, 40]]
+
+        with pytest.raises(pyslabs.error.PE_Read_Invalidkey):
+            ndata[data[0] > 1]
+
+        with pytest.raises(pyslabs.error.PE_Read_Invalidkey):
+            ndata.lazy()[:, [1, 2]]
+
+        lazy = ndata.lazy()[::-1][..., 3:0:-1]
+        assert np.array_equal(lazy.compute(), data[::-1][..., 3:0:-1])
+
+    os.remove(slabfile)
+
+
+def test_builtin_tiles():
+
+    nlevels, ntiles, tsize = 20, 4, 500
+
+    data = [tuple((l, i) for i in range(ntiles*tsize)) for l in range(nlevels)]
+
+    with pyslabs.open(slabfile, "w") as slabs:
+        myvar = slabs.get_writer("myvar", (nlevels, ntiles*tsize, 2),
+                                 autostack=True)
+
+        for l in range(nlevels):
+            for t in range(ntiles):
+                myvar.write(data[l][t*tsize:(t+1)*tsize], (t*tsize, 0),
+                            level=l)
+
+    with pyslabs.open(slabfile) as slabs:
+        myvar = slabs.get_reader("myvar")
+
+        whole = myvar[:]
+        assert whole == tuple(data)
+        assert type(whole[0]) is tuple and type(whole[0][0]) is tuple
+
+        assert myvar[3, 400:1600:7] == data[3][400:1600:7]
+        assert myvar[::-3, 1999, 1] == tuple(d[1999][1] for d in data[::-3])
+        assert myvar[-1, ::-250, 0] == tuple(d[0] for d in data[-1][::-250])
+
+
+@pytest.mark.parametrize("layout", [None, "columnar"])
+def test_fields(layout):
+
+    import numpy as np
+
+    dtype = np.dtype([("mass", "f8"), ("id", "i4"), ("pos", "f4")])
+    data = np.zeros((6, 40), dtype=dtype)
+    data["mass"] = np.arange(240).reshape((6, 40)) * 0.5
+    data["id"] = np.arange(240).reshape((6, 40))
+    data["pos"] = -np.arange(240).reshape((6, 40))
+
+    with pyslabs.open(slabfile, "w") as slabs:
+        pvar = slabs.get_writer("particles", (6, 40), autostack=True,
+                                layout=layout)
+
+        for t in range(6):
+            pvar.write(data[t, :25], 0)
+            pvar.write(data[t, 25:], 25, level=t)
+
+    with pyslabs.open(slabfile, cache_size=0) as slabs:
+        pvar = slabs.get_reader("particles")
+        assert pvar.dtype == dtype
+
+        assert np.array_equal(pvar[:], data)
+        assert np.array_equal(pvar[2, 10:30], data[2, 10:30])
+
+        nbytes = slabs.slab_pool.nbytes
+        mass = pvar.get_array((slice(1, 5), slice(20, 35)), fields="mass")
+        assert np.array_equal(mass, data["mass"][1:5, 20:35])
+
+        if layout == "columnar":
+            # only the rows of the mass field are read
+            assert slabs.slab_pool.nbytes - nbytes == 4 * 15 * 8
+
+        sub = pvar.lazy()[3, ::3][["id", "mass"]]
+        assert sub.dtype.names == ("id", "mass")
+        block = sub.compute()
+        assert np.array_equal(block["id"], data["id"][3, ::3])
+        assert np.array_equal(block["mass"], data["mass"][3, ::3])
+
+        with pytest.raises(pyslabs.error.PE_Read_Unknownfield):
+            pvar.get_array(0, fields="velocity")
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_reduce(workers):
+
+    import numpy as np
+
+    data = np.random.default_rng(7).normal(size=(12, 30, 20))
+    key = (slice(2, 11), slice(5, 28, 2), 7)
+
+    with pyslabs.open(slabfile, "w") as slabs:
+        myvar = slabs.get_writer("myvar", (12, 30, 20), autostack=True)
+
+        for t in range(12):
+            for st in range(0, 30, 10):
+                myvar.write(data[t, st:st+10], (st, 0), level=t)
+
+    with pyslabs.open(slabfile, workers=workers) as slabs:
+        for op in ("sum", "mean", "min", "max", "var"):
+            assert np.allclose(slabs.reduce("myvar", op),
+                               getattr(np, op)(data))
+            assert np.allclose(slabs.reduce("myvar", op, axis=0),
+                               getattr(np, op)(data, axis=0))
+            assert np.allclose(slabs.reduce("myvar", op, axis=(0, -1)),
+                               getattr(np, op)(data, axis=(0, 2)))
+            assert np.allclose(slabs.reduce("myvar", op, axis=1, key=key),
+                               getattr(np, op)(data[key], axis=1))
+
+        assert slabs.reduce("myvar", "count", axis=0).tolist() == \
+            np.full((30, 20), 12).tolist()
+
+        with pytest.raises(pyslabs.error.PE_Reduce_Unknownop):
+            slabs.reduce("myvar", "median")
+
+        with pytest.raises(pyslabs.error.PE_Reduce_Invalidaxis):
+            slabs.reduce("myvar", "sum", axis=3)
+
+
+def test_where():
+
+    import numpy as np
+
+    nlevels = 40
+    data = np.zeros((nlevels, 16, 12))
+    events = [(5, 3, 4), (5, 12, 1), (22, 9, 9), (37, 0, 11)]
+
+    for t, y, x in events:
+        data[t, y, x] = 10.0 + t
+
+    data[30, 2, 2] = np.nan
+
+    with pyslabs.open(slabfile, "w") as slabs:
+        myvar = slabs.get_writer("myvar", (nlevels, 16, 12), autostack=True,
+                                 ranges=True)
+
+        for t in range(nlevels):
+            myvar.write(data[t, :8], 0)
+            myvar.write(data[t, 8:], 8, level=t)
+
+    with pyslabs.open(slabfile, cache_size=0) as slabs:
+        myvar = slabs.get_reader("myvar")
+        assert tuple(myvar.manifest["0_8/0_12/5.numpy.npy"]["range"]) == \
+            (0.0, 15.0, False)
+
+        indices = slabs.where("myvar", (">", 5.0))
+        assert indices.tolist() == [list(e) for e in events]
+
+        # only the slabs with events are read
+        nbytes = slabs.slab_pool.nbytes
+        assert slabs.select_levels("myvar", (">=", 10.0)) == [5, 22, 37]
+        assert slabs.slab_pool.nbytes - nbytes <= 4 * 800
+
+        key = (slice(None), slice(8, 16), slice(0, 6))
+        assert slabs.select_levels("myvar", (">", 1.0), key) == [5]
+        assert slabs.where("myvar", (">", 1.0), key).tolist() == [[5, 4, 1]]
+
+        # all values of the slabs satisfy the predicate: nothing is read
+        nbytes = slabs.slab_pool.nbytes
+        levels = slabs.select_levels("myvar", ("<", 100.0), (slice(0, 10),))
+        assert levels == list(range(10))
+        assert slabs.slab_pool.nbytes == nbytes
+
+        # NaN satisfies "!=" only
+        assert slabs.where("myvar", ("!=", 0.0), 30).tolist() == [[2, 2]]
+
+        with pytest.raises(pyslabs.error.PE_Read_Invalidpredicate):
+            slabs.where("myvar", ("~", 1.0))
+
+
+@pytest.mark.parametrize("method", ["mean", "stride"])
+def test_overviews(method):
+
+    import numpy as np
+
+    data = np.arange(3*64*40, dtype=np.float64).reshape((3, 64, 40))
+
+    with pyslabs.open(slabfile, "w") as slabs:
+        myvar = slabs.get_writer("myvar", (3, 64, 40), autostack=True,
+                                 overviews=(2, 4, 8), overview_method=method)
+
+        for t in range(3):
+            myvar.write(data[t, :24], 0)
+            myvar.write(data[t, 24:], 24, level=t)
+
+    def _expected(factor, t):
+
+        if method == "stride":
+            return data[t, ::factor, ::factor]
+
+        return data[t].reshape((64//factor, factor, 40//factor,
+                                factor)).mean(axis=(1, 3))
+
+    with pyslabs.open(slabfile) as slabs:
+        assert slabs.info("list") == ("myvar",)
+
+        for k, factor in enumerate((2, 4, 8), 1):
+            ov = slabs.get_array("myvar", overview=k)
+            assert ov.shape == (3, 64//factor, 40//factor)
+
+            for t in range(3):
+                assert np.allclose(ov[t], _expected(factor, t))
+
+        # a region in the coordinates of the variable
+        ov = slabs.get_array("myvar", (1, slice(16, 48), slice(8, 40)),
+                             overview=2)
+        assert np.allclose(ov, _expected(4, 1)[4:12, 2:10])
+
+        # the finest overview of at most target elements
+        ov = slabs.get_array("myvar", 0, target=100)
+        assert ov.shape == (8, 5)
+        ov = slabs.get_array("myvar", 0, target=64*40)
+        assert np.array_equal(ov, data[0])
+
+        with pytest.raises(pyslabs.error.PE_Read_Nooverview):
+            slabs.get_array("myvar", overview=4)
+
+        with pytest.raises(pyslabs.error.PE_Read_Nooverview):
+            slabs.get_array("myvar", overview=-1)
+
+
+def test_sel():
+
+    import numpy as np
+
+    data = np.arange(6*20*10, dtype=np.float32).reshape((6, 20, 10))
+    lats = [-45.0 + 10.0 * i for i in range(10)]
+
+    with pyslabs.open(slabfile, "w") as slabs:
+        time = slabs.define_stack("time", 6, origin=(0.0, "s"),
+                                  unit=(3600.0, "s"))
+        lon = slabs.define_dim("lon", 20, origin=(500.0, "m"),
+                               unit=(100.0, "m"))
+        lat = slabs.define_dim("lat", 10, points=lats)
+        myvar = slabs.get_writer("myvar", (time, lon, lat), autostack=True)
+
+        for t in range(6):
+            myvar.write(data[t])
+
+    with pyslabs.open(slabfile) as slabs:
+        assert np.array_equal(slabs.sel("myvar", time=7200.0), data[2])
+
+        block = slabs.sel("myvar", lon=(1000.0, 2500.0), time=3600.0)
+        assert np.array_equal(block, data[1, 5:21])
+
+        block = slabs.sel("myvar", lat=(-20.0, 20.0), lon=(None, 800.0))
+        assert np.array_equal(block, data[:, :4, 3:7])
+
+        block = slabs.sel("myvar", time=5000.0, lat=13.0, method="nearest")
+        assert np.array_equal(block, data[1, :, 6])
+
+        with pytest.raises(pyslabs.error.PE_Sel_Notfound):
+            slabs.sel("myvar", time=5000.0)
+
+        with pytest.raises(pyslabs.error.PE_Sel_Unknowndim):
+            slabs.sel("myvar", depth=1.0)
+
+
+def _offset_filter(block, offset):
+
+    return block * 2 + offset[0]
+
+
+def _block_sum(block, offset):
+
+    return float(block.sum())
+
+
+@pytest.mark.parametrize("workers", [None, 2])
+def test_map_slabs(workers):
+
+    import numpy as np
+
+    data = np.arange(5*30*8, dtype=np.float64).reshape((5, 30, 8))
+
+    with pyslabs.open(slabfile, "w") as slabs:
+        myvar = slabs.get_writer("myvar", (5, 30, 8), autostack=True)
+
+        for t in range(5):
+            for st in range(0, 30, 10):
+                myvar.write(data[t, st:st+10], (st, 0), level=t)
+
+    with pyslabs.open(slabfile) as slabs:
+        sums = list(slabs.map_slabs("myvar", _block_sum, workers=workers))
+        assert len(sums) == 5 * 3
+        assert sorted(sums)[4] == ((1, 10, 0), data[1, 10:20].sum())
+
+        key = (slice(1, 4), slice(5, 25, 2), 3)
+        out = slabs.map_slabs("myvar", _offset_filter, key=key,
+                              workers=workers, assemble=True)
+        expected = data[key] * 2 + np.arange(1, 4)[:, None]
+        assert np.array_equal(out, expected)
+
+        # offsets are in the order of the output for negative steps
+        key = (slice(3, 0, -2), slice(25, 2, -3), 1)
+        blocks = list(slabs.map_slabs("myvar", _block_sum, key=key,
+                                      workers=workers))
+        assert [o for o, _ in blocks[:2]] == [(3, 7, 1), (1, 7, 1)]
+        assert blocks[-1] == ((1, 25, 1), data[1, 25:19:-3, 1].sum())
+
+        out = slabs.map_slabs("myvar", _offset_filter, key=key,
+                              workers=workers, assemble=True)
+        assert np.array_equal(out, data[key] * 2 + np.array([[3], [1]]))
+
+
+@pytest.mark.parametrize("levels", [None, 8])
+def test_pencils(levels):
+
+    import numpy as np
+
+    data = np.arange(20*12*10, dtype=np.float64).reshape((20, 12, 10))
+
+    with pyslabs.open(slabfile, "w") as slabs:
+        myvar = slabs.get_writer("myvar", (20, 12, 10), autostack=True,
+                                 pencils=(4, 5), pencil_levels=levels)
+
+        for t in range(20):
+            myvar.write(data[t, :7], 0)
+            myvar.write(data[t, 7:], 7, level=t)
+
+    with pyslabs.open(slabfile) as slabs:
+        assert slabs.info("list") == ("myvar",)
+
+        myvar = slabs.get_reader("myvar")
+        pencils = myvar.pencils
+        assert len(pencils.manifest) == 3 * 2 * (1 if levels is None else 3)
+
+        # a point over the stack is read from the pencils
+        misses = slabs.cache_info()["misses"]
+        assert np.array_equal(myvar[:, 5, 6], data[:, 5, 6])
+        assert slabs.cache_info()["misses"] - misses == (1 if levels is None
+                                                         else 3)
+
+        # a level is read from the two tiles of the slabs
+        misses = slabs.cache_info()["misses"]
+        assert np.array_equal(myvar[3], data[3])
+        assert slabs.cache_info()["misses"] - misses == 2
+
+        for key in [(slice(2, 17, 3), slice(1, 11), 9), (slice(None, None, -1),
+                    11), (slice(None), slice(None), slice(2, 3))]:
+            assert np.array_equal(myvar[key], data[key])
+
+
+def test_pencilbuffer(monkeypatch):
+
+    import numpy as np
+
+    # a group of 8 levels is over the buffer: one pencil slab at a time
+    monkeypatch.setattr(pyslabs.pencil, "PENCIL_BUFSIZE", 8 * 12 * 10)
+    data = np.arange(20*12*10, dtype=np.float64).reshape((20, 12, 10))
+
+    with pyslabs.open(slabfile, "w") as slabs:
+        myvar = slabs.get_writer("myvar", (20, 12, 10), autostack=True,
+                                 pencils=(4, 5), pencil_levels=8)
+
+        for t in range(20):
+            myvar.write(data[t, :7], 0)
+            myvar.write(data[t, 7:], 7, level=t)
+
+        with pytest.raises(pyslabs.error.PE_Write_Unknownpencil):
+            slabs.get_writer("columns", layout="columnar", pencils=4)
+
+        label = slabs.get_writer("label", autostack=True, pencils=4)
+
+        with pytest.raises(pyslabs.error.PE_Write_Unknownpencil):
+            label.write(["a", "b"])
+
+        label.write(np.zeros(2))
+
+    with pyslabs.open(slabfile) as slabs:
+        myvar = slabs.get_reader("myvar")
+        assert len(myvar.pencils.manifest) == 3 * 2 * 3
+        assert myvar.pencils.manifest["8_4/5_5/16_4.numpy.npy"]["level"] == 16
+        assert np.array_equal(myvar[:, 9, 7], data[:, 9, 7])
+        assert np.array_equal(myvar[:, 2:11, 3], data[:, 2:11, 3])
+
+
+def test_pencilblank():
+
+    import numpy as np
+
+    data = np.arange(6*8*4, dtype=np.float64).reshape((6, 8, 4))
+
+    # the second tile of level 2 is not written
+    with pyslabs.open(slabfile, "w") as slabs:
+        fvar = slabs.get_writer("fvar", (6, 8, 4), autostack=True,
+                                pencils=4)
+        ivar = slabs.get_writer("ivar", (6, 8, 4), autostack=True,
+                                pencils=4)
+
+        for t in range(6):
+            for var, values in ((fvar, data[t]), (ivar, data[t].astype(int))):
+                var.write(values[:4], 0)
+
+                if t != 2:
+                    var.write(values[4:], 4, level=t)
+
+    with pyslabs.open(slabfile) as slabs:
+        fvar = slabs.get_reader("fvar")
+        expected = data[:, 6, 1].copy()
+        expected[2] = np.nan
+        assert np.array_equal(fvar[:, 6, 1], expected, equal_nan=True)
+        assert np.array_equal(fvar[:, 1, 1], data[:, 1, 1])
+
+        ivar = slabs.get_reader("ivar")
+        expected[2] = 0
+        assert np.array_equal(ivar[:, 6, 1], expected.astype(int))
+
+
+def test_missingslab():
+
+    import numpy as np
+
+    with pyslabs.open(slabfile, "w") as slabs:
+        myvar = slabs.get_writer("myvar")
+        myvar.write(np.zeros(3), 0, level=0)
+        myvar.write(np.zeros(3), 0, level=1)
+        myvar.write(np.ones(3), 3, level=0)
+
+    with pyslabs.open(slabfile) as slabs:
+        myvar = slabs.get_reader("myvar")
+        assert myvar.slabtype == "numpy"
+        assert np.array_equal(myvar[0], [0, 0, 0, 1, 1, 1])
+
+        with pytest.raises(pyslabs.error.PE_Read_Missingslab):
+            myvar[1]